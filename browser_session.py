@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import requests
+import urllib3
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger("module_freeboxos")
+
+SESSION_STATE_FILE = "/home/seluser/.local/share/select_freeboxos/browser_session.json"
+DEFAULT_REMOTE_URL = "http://localhost:4444"
+DEFAULT_MAX_RSS_MB = 1200
+
+FIREFOX_PROCESS_NAMES = ("firefox", "firefox-bin", "firefox-esr")
+
+
+class _AttachedRemote(webdriver.Remote):
+    """Remote driver bound to an existing session instead of creating one."""
+
+    def __init__(self, command_executor, session_id, options):
+        self._attach_session_id = session_id
+        super().__init__(command_executor=command_executor, options=options)
+
+    def start_session(self, capabilities):
+        self.session_id = self._attach_session_id
+        self.caps = {}
+
+
+def firefox_rss_mb():
+    """Resident memory of all Firefox processes and their children, in MB."""
+    parents = {}
+    names = {}
+    rss = {}
+
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("Name:"):
+                        names[pid] = line.split(None, 1)[1].strip()
+                    elif line.startswith("PPid:"):
+                        parents[pid] = line.split()[1]
+                    elif line.startswith("VmRSS:"):
+                        rss[pid] = int(line.split()[1])
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+
+    def in_firefox_tree(pid):
+        while pid in names:
+            if names[pid] in FIREFOX_PROCESS_NAMES:
+                return True
+            pid = parents.get(pid)
+        return False
+
+    total_kb = sum(kb for pid, kb in rss.items() if in_firefox_tree(pid))
+    return total_kb / 1024
+
+
+class BrowserSession:
+    """
+    Firefox session kept alive between scheduling runs.
+
+    With a remote_url, the browser runs in the Selenium server of the
+    container and its session id is saved in state_file, so that the next
+    run attaches to the already logged-in browser instead of starting a new
+    one. The browser is only restarted when it crashed or when its memory
+    use exceeds max_rss_mb. Without remote_url a local Firefox is started
+    and quit after each run, unless the session is persistent (kept by a
+    long-running process between runs).
+    """
+
+    def __init__(self, options, remote_url=None, state_file=SESSION_STATE_FILE,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB, persistent=False):
+        self.options = options
+        self.remote_url = remote_url
+        self.state_file = state_file
+        self.max_rss_mb = max_rss_mb
+        self.persistent = persistent
+        self.driver = None
+        self.reused = False
+
+    def start(self):
+        """Return a working driver, reusing the resident browser if possible."""
+        if self.driver is not None:
+            try:
+                self.driver.current_url
+                self.reused = True
+            except (WebDriverException, urllib3.exceptions.HTTPError):
+                logger.info("Le navigateur ne répond plus. Démarrage d'un nouveau navigateur.")
+                self.close()
+
+        if self.driver is None and self.remote_url is not None:
+            self.driver = self._attach()
+
+        if self.driver is not None and self._over_memory_limit():
+            logger.info("Redémarrage du navigateur: limite mémoire dépassée.")
+            self.close()
+
+        if self.driver is not None:
+            return self.driver
+
+        self.reused = False
+        if self.remote_url is not None:
+            self._delete_orphan_sessions()
+            try:
+                self.driver = webdriver.Remote(
+                    command_executor=self.remote_url, options=self.options
+                )
+                self._save_state()
+                return self.driver
+            except urllib3.exceptions.HTTPError:
+                logger.warning(
+                    "Serveur Selenium injoignable. Démarrage d'un navigateur local."
+                )
+                self.remote_url = None
+
+        self.driver = webdriver.Firefox(options=self.options)
+        return self.driver
+
+    def release(self):
+        """End of run: keep the resident browser, quit a local one."""
+        if self.driver is None:
+            return
+        if self._over_memory_limit() or (self.remote_url is None and not self.persistent):
+            self.close()
+            return
+        if self.remote_url is not None:
+            self._save_state()
+
+    def close(self):
+        """Quit the browser and forget the resident session."""
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+        self.driver = None
+        self.reused = False
+        try:
+            os.remove(self.state_file)
+        except FileNotFoundError:
+            pass
+
+    def _attach(self):
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if state.get("remote_url") != self.remote_url:
+            return None
+
+        try:
+            driver = _AttachedRemote(self.remote_url, state["session_id"], self.options)
+            driver.current_url
+        except (WebDriverException, KeyError, urllib3.exceptions.HTTPError):
+            logger.info("Le navigateur résident ne répond plus. Démarrage d'un nouveau navigateur.")
+            return None
+
+        self.reused = True
+        return driver
+
+    def _save_state(self):
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {"remote_url": self.remote_url, "session_id": self.driver.session_id}, f
+            )
+
+    def _over_memory_limit(self):
+        if not self.max_rss_mb:
+            return False
+        return firefox_rss_mb() > self.max_rss_mb
+
+    def _delete_orphan_sessions(self):
+        """Free Selenium server slots held by sessions we lost track of."""
+        try:
+            status = requests.get(self.remote_url + "/status", timeout=5).json()
+            for node in status["value"].get("nodes", []):
+                for slot in node.get("slots", []):
+                    session = slot.get("session")
+                    if session:
+                        requests.delete(
+                            f"{self.remote_url}/session/{session['sessionId']}", timeout=10
+                        )
+        except (requests.RequestException, ValueError, KeyError):
+            pass
@@ -0,0 +1,56 @@
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Maximum number of seconds to wait for each step of the scheduling. These
+# are ceilings: every wait returns as soon as the expected DOM state is
+# reached. They can be overridden with WAIT_TIMEOUTS in config.json.
+DEFAULT_TIMEOUTS = {
+    "page_load": 30,
+    "login": 30,
+    "open_form": 15,
+    "channel": 5,
+    "date_picker": 5,
+    "time_input": 10,
+    "title": 5,
+    "save": 20,
+    "cancel": 10,
+}
+
+POLL_FREQUENCY = 0.2
+
+FORM_FIELD = (By.NAME, "channel_uuid")
+
+
+class StepWaits:
+    """Condition based waits with a configurable ceiling per step."""
+
+    def __init__(self, driver, timeouts=None, poll_frequency=POLL_FREQUENCY):
+        self.driver = driver
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update({k: float(v) for k, v in timeouts.items()})
+        self.poll_frequency = poll_frequency
+
+    def until(self, step, condition, message=""):
+        """Wait for condition, raising TimeoutException after the step ceiling."""
+        return WebDriverWait(
+            self.driver, self.timeouts[step], poll_frequency=self.poll_frequency
+        ).until(condition, message or f"Timeout during step {step}")
+
+    def visible(self, step, locator):
+        return self.until(step, EC.visibility_of_element_located(locator))
+
+    def clickable(self, step, locator):
+        return self.until(step, EC.element_to_be_clickable(locator))
+
+    def gone(self, step, locator):
+        return self.until(step, EC.invisibility_of_element_located(locator))
+
+    def value(self, step, element, predicate):
+        """Wait until predicate(element's value attribute) is true."""
+        return self.until(step, lambda d: predicate(element.get_attribute("value")))
+
+    def form_closed(self, step):
+        """Wait for the 'Programmer un enregistrement' dialog to close."""
+        return self.gone(step, FORM_FIELD)
@@ -1,3 +1,6 @@
+import unicodedata
+
+
 CHANNELS_FREE = {
     "6TER": "22",
     "8 MONT-BLANC": "902",
@@ -203,3 +206,85 @@ CHANNELS_FREE = {
     "W9": "9",
     "WARNER TV": "57",
 }
+
+# Other names of channels of CHANNELS_FREE which do not only differ by case,
+# accents, spacing, punctuation or "+" written "PLUS"
+CHANNEL_ALIASES = {
+    "LCP": "LA CHAINE PARLEMENTAIRE",
+    "LCI": "LCI - LA CHAINE INFO",
+    "PUBLIC SENAT": "PUBLIC SENAT 2424",
+    "FRANCE INFO TV": "FRANCEINFO",
+    "RTL9": "RTL 9",
+    "BBC ONE": "BBC 1",
+    "TF1 SERIES-FILMS": "TF1 SERIES FILMS",
+    "TV BREIZH": "TVBREIZH",
+    "SKY NEWS": "SKYNEWS",
+}
+
+# Channels sharing a number on purpose: LCP took over number 8 from C8
+SHARED_NUMBERS = {
+    "8": {"C8", "LA CHAINE PARLEMENTAIRE", "LCP 100%"},
+}
+
+
+def normalize_channel_name(name):
+    """
+    Lookup key of a channel name: without accents, case, "+" written
+    "PLUS", and any character other than letters and digits.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    key = "".join(c for c in decomposed if not unicodedata.combining(c))
+    key = key.upper().replace("+", "PLUS").replace("&", "ET")
+    return "".join(c for c in key if c.isalnum())
+
+
+def build_channel_index(channels, aliases):
+    """
+    Map the normalized channel names and aliases to channel numbers.
+    Raises ValueError when two names of different channels have the same key
+    or when an alias refers to an unknown channel.
+    """
+    index = {}
+    names = {}
+    for name, number in channels.items():
+        key = normalize_channel_name(name)
+        if key in index and index[key] != number:
+            raise ValueError(f"{name!r} and {names[key]!r} have the same lookup key {key!r}")
+        index[key] = number
+        names[key] = name
+
+    for alias, name in aliases.items():
+        if name not in channels:
+            raise ValueError(f"alias {alias!r} refers to unknown channel {name!r}")
+        key = normalize_channel_name(alias)
+        if key in index and index[key] != channels[name]:
+            raise ValueError(f"alias {alias!r} is already the name of {names[key]!r}")
+        index[key] = channels[name]
+
+    return index
+
+
+def build_number_index(channels):
+    """Map each channel number to the sorted names using it."""
+    numbers = {}
+    for name, number in channels.items():
+        numbers.setdefault(number, []).append(name)
+    return {number: sorted(names) for number, names in numbers.items()}
+
+
+def find_number_collisions(channels=CHANNELS_FREE, shared=SHARED_NUMBERS):
+    """Channel numbers used by several channels, other than SHARED_NUMBERS."""
+    return {
+        number: names
+        for number, names in build_number_index(channels).items()
+        if len(names) > 1 and set(names) - shared.get(number, set())
+    }
+
+
+CHANNEL_INDEX = build_channel_index(CHANNELS_FREE, CHANNEL_ALIASES)
+CHANNEL_NAMES_BY_NUMBER = build_number_index(CHANNELS_FREE)
+
+
+def channel_number(name):
+    """Freebox channel number of a MEDIA-select channel name, or None."""
+    return CHANNEL_INDEX.get(normalize_channel_name(name))
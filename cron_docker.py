@@ -1,165 +1,213 @@
 import logging
 import json
 import os
-import requests
 import sys
+import time
 
 from pathlib import Path
-from subprocess import Popen, PIPE, run
+from subprocess import Popen, PIPE
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
 
-log_file = "/var/log/select_freeboxos/select_freeboxos.log"
-max_bytes = 10 * 1024 * 1024  # 10 MB
-backup_count = 5
-log_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+import metrics
 
-log_format = '%(asctime)s %(levelname)s %(message)s'
-log_datefmt = '%d-%m-%Y %H:%M:%S'
-formatter = logging.Formatter(log_format, log_datefmt)
+from progweek import (
+    API_URL,
+    MODIFIED,
+    NOT_MODIFIED,
+    FetchError,
+    fetch,
+    load_validators,
+)
+from recordings_store import RecordingStore
 
-log_handler.setFormatter(formatter)
+logger = logging.getLogger("module_freeboxos")
 
-logger = logging.getLogger()
-logger.addHandler(log_handler)
+CONFIG_PATH = Path("/home/seluser/.config/select_freeboxos/config.json")
 
-logger.setLevel(logging.INFO)
+INFO_PROGS = '/home/seluser/.local/share/select_freeboxos/info_progs.json'
+INFO_PROGS_LAST = '/home/seluser/.local/share/select_freeboxos/info_progs_last.json'
+PURGE_DELAY = 7 * 24 * 3600
 
-CONFIG_PATH = Path("/home/seluser/.config/select_freeboxos/config.json")
+# sha256 of the info_progs.json synced in a recordings store
+SYNCED_HASH = "programmes_sha256"
+
+def setup_logging():
+    log_file = "/var/log/select_freeboxos/select_freeboxos.log"
+    max_bytes = 10 * 1024 * 1024  # 10 MB
+    backup_count = 5
+    log_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+
+    log_format = '%(asctime)s %(levelname)s %(message)s'
+    log_datefmt = '%d-%m-%Y %H:%M:%S'
+    formatter = logging.Formatter(log_format, log_datefmt)
 
-try:
-    with CONFIG_PATH.open(encoding="utf-8") as f:
-        config = json.load(f)
-except FileNotFoundError:
-    logger.error("Missing config.json file")
-    sys.exit(1)
-except json.JSONDecodeError:
-    logger.error("Invalid JSON in config.json")
-    sys.exit(1)
+    log_handler.setFormatter(formatter)
 
-CRYPTED_CREDENTIALS = bool(config.get("CRYPTED_CREDENTIALS", False))
+    root_logger = logging.getLogger()
+    root_logger.addHandler(log_handler)
 
-def get_file_modification_time(file_path):
+    root_logger.setLevel(logging.INFO)
+
+def load_config():
     try:
-        mod_time = os.path.getmtime(file_path)
-        return datetime.fromtimestamp(mod_time)
+        with CONFIG_PATH.open(encoding="utf-8") as f:
+            return json.load(f)
     except FileNotFoundError:
-        logger.error(f"File not found: {file_path}")
-        return None
+        logger.error("Missing config.json file")
+        sys.exit(1)
+    except json.JSONDecodeError:
+        logger.error("Invalid JSON in config.json")
+        sys.exit(1)
 
-def remove_items(INFO_PROGS, INFO_PROGS_LAST, PROGS_TO_RECORD):
-    # Remove items already set to be recorded
+def sync_programmes(INFO_PROGS, store):
+    # Add the new programmes to the recordings store
     try:
         with open(INFO_PROGS, 'r') as f:
             source_data = json.load(f)
     except FileNotFoundError:
         logger.error(
-        "No info_progs.json file. Need to check curl command or "
+        "No info_progs.json file. Need to check the API download or "
         "internet connection. Exit programme."
         )
         sys.exit(1)
     except json.decoder.JSONDecodeError:
         logger.error(
-        "JSONDecodeError in info_progs.json file. Need to check curl command or "
+        "JSONDecodeError in info_progs.json file. Need to check the API download or "
         "internet connection. Exit programme."
         )
         sys.exit(1)
 
+    return store.sync(source_data)
+
+def migrate_info_progs_last(INFO_PROGS_LAST, store):
+    # Programmes scheduled before the recordings store existed
+    if not store.is_empty() or not os.path.exists(INFO_PROGS_LAST):
+        return
+
     try:
         with open(INFO_PROGS_LAST, 'r') as f:
-            items_to_remove = json.load(f)
+            store.import_scheduled(json.load(f))
+    except json.decoder.JSONDecodeError:
+        return
+
+    store.set_meta("last_run", int(os.path.getmtime(INFO_PROGS_LAST)))
+    logger.info("info_progs_last.json imported in the recordings store.")
+
+def programmes_due(store):
+    """Programmes are scheduled once a day, until a run completed."""
+    last_run = store.last_run()
+    return last_run is None or last_run.date() < datetime.now().date()
+
+def info_progs_fresh():
+    """True when info_progs.json was downloaded less than 30 minutes ago."""
+    try:
+        info_file = os.stat(INFO_PROGS)
     except FileNotFoundError:
-        items_to_remove = []
+        return False
+    file_age = datetime.now().timestamp() - info_file.st_mtime
+    return file_age <= 1800 and info_file.st_size != 0
+
+def download_programmes(config):
+    """
+    Download the MEDIA-select programmes in INFO_PROGS.
+    Returns MODIFIED, NOT_MODIFIED or None if the download failed.
+    """
+    crypted_credentials = bool(config.get("CRYPTED_CREDENTIALS", False))
+    api_url = config.get("MEDIA_SELECT_API_URL", API_URL)
+
+    if not crypted_credentials:
+        netrc_path = os.path.expanduser("/home/seluser/.netrc")
+        if not os.path.exists(netrc_path):
+            logger.error("No .netrc file. Exit program")
+            sys.exit(1)
+
+    fetch_status = None
+    started = time.perf_counter()
+    try:
+        # Without crypted credentials, requests reads them from ~/.netrc
+        auth = None
+        if crypted_credentials:
+            username_mediaselect = os.getenv("USERNAME_MEDIASELECT")
+            password_mediaselect = os.getenv("PASSWORD_MEDIASELECT")
+
+            if username_mediaselect is None or password_mediaselect is None:
+                logger.error("Environment variables are empty.")
+                raise ValueError("Environment variables are empty.")
+
+            auth = (username_mediaselect, password_mediaselect)
+
+        fetch_status = fetch(INFO_PROGS, auth, api_url)
+        if fetch_status == MODIFIED:
+            logger.info("Data downloaded successfully.")
+    except FetchError as e:
+        logger.error(f"Error: {e}")
+    except ValueError as e:
+        logger.error(f"Error: {e}")
+
+    metrics.FETCH_DURATION.set(round(time.perf_counter() - started, 3))
+    metrics.FETCHES.inc(result=fetch_status or "error")
+    if fetch_status is not None:
+        metrics.LAST_FETCH_SUCCESS.set(int(time.time()))
+        metrics.FETCH_BYTES.set(os.path.getsize(INFO_PROGS) if fetch_status == MODIFIED else 0)
+
+    if fetch_status == NOT_MODIFIED:
+        os.utime(INFO_PROGS, None)
+
+    return fetch_status
+
+def update_store(store):
+    """
+    Add the downloaded programmes to the store, unless it already holds
+    this content of info_progs.json (a new box store is synced even when
+    the download was not modified).
+    Returns True when programmes are waiting to be scheduled.
+    """
+    content_hash = load_validators(INFO_PROGS).get("sha256")
+    if content_hash is None or store.get_meta(SYNCED_HASH) != content_hash:
+        change_set = sync_programmes(INFO_PROGS, store)
+        if content_hash is not None:
+            store.set_meta(SYNCED_HASH, content_hash)
+        store.purge(int(datetime.now().timestamp()) - PURGE_DELAY)
+        logger.info(
+            "Programmes: %s new, %s removed, %s unchanged.",
+            len(change_set.added), len(change_set.removed), len(change_set.unchanged)
+        )
 
-    modified_data = [item for item in source_data if item not in items_to_remove]
+    if not store.pending():
+        logger.info("No programme to schedule.")
+        return False
 
-    with open(PROGS_TO_RECORD, 'w') as f:
-        json.dump(modified_data, f, indent=4)
+    return True
 
-INFO_PROGS = '/home/seluser/.local/share/select_freeboxos/info_progs.json'
-INFO_PROGS_LAST = '/home/seluser/.local/share/select_freeboxos/info_progs_last.json'
-PROGS_TO_RECORD = '/home/seluser/.local/share/select_freeboxos/progs_to_record.json'
-API_URL = "https://www.media-select.fr/api/v1/progweek"
+def refresh_programmes(config, store):
+    """
+    Download the MEDIA-select programmes when needed and update the store.
+    Returns True when programmes are waiting to be scheduled.
+    """
+    migrate_info_progs_last(INFO_PROGS_LAST, store)
 
-if not CRYPTED_CREDENTIALS:
-    netrc_path = os.path.expanduser("/home/seluser/.netrc")
-    if not os.path.exists(netrc_path):
-        logger.error("No .netrc file. Exit program")
-        sys.exit(1)
+    if not programmes_due(store) or info_progs_fresh():
+        return False
 
-stat_result = run(
-    ["stat", "-c", "%Y-%s", INFO_PROGS],
-    capture_output=True,
-    text=True,
-    check=False
-)
-error_file = stat_result.stderr.strip()
-
-if error_file == "":
-     info_file = stat_result.stdout.strip().split("-")
-     time_file = datetime.fromtimestamp(int(info_file[0]))
-     time_diff = datetime.now() - time_file
-     size_file = int(info_file[1])
-
-info_progs_last_mod_time = get_file_modification_time(INFO_PROGS_LAST)
-
-if info_progs_last_mod_time is None or info_progs_last_mod_time.date() < datetime.now().date():
-    if error_file != "" or time_diff.total_seconds() > 1800 or size_file == 0:
-        if CRYPTED_CREDENTIALS:
-            try:
-                username_mediaselect = os.getenv("USERNAME_MEDIASELECT")
-                password_mediaselect = os.getenv("PASSWORD_MEDIASELECT")
-
-                if username_mediaselect is None or password_mediaselect is None:
-                    logger.error("Environment variables are empty.")
-                    raise ValueError("Environment variables are empty.")
-
-                response = requests.get(
-                    API_URL,
-                    auth=(username_mediaselect, password_mediaselect),
-                    headers={"Accept": "application/json; indent=4"},
-                    timeout=10,
-                )
-
-                response.raise_for_status()
-
-                with open(INFO_PROGS, "w") as f:
-                    f.write(response.text)
-
-                logger.info("Data downloaded with requests successfully.")
-
-            except requests.RequestException as e:
-                logger.error(f"API request failed: {e}")
-            except ValueError as e:
-                logger.error(f"Error: {e}")
-        else:
-            try:
-                curl_result = run(
-                    [
-                        "curl",
-                        "-H", "Accept: application/json;indent=4",
-                        "-n",
-                        API_URL,
-                    ],
-                    stdout=PIPE,
-                    stderr=PIPE,
-                    text=False,  # Keep as bytes
-                    check=False
-                )
-
-                with open(INFO_PROGS, "wb") as json_file:
-                    json_file.write(curl_result.stdout)
-
-                logger.info("Data downloaded with curl successfully.")
-
-            except Exception as e:
-                logger.error(f"Error: {str(e)}\n")
-
-        remove_items(INFO_PROGS, INFO_PROGS_LAST, PROGS_TO_RECORD)
+    download_programmes(config)
+    return update_store(store)
+
+def main():
+    setup_logging()
+    config = load_config()
 
+    with RecordingStore() as store:
+        to_schedule = refresh_programmes(config, store)
+
+    if to_schedule:
         Popen(
             ["bash", "cron_freeboxos_app.sh"],
             cwd="/home/seluser/select-freeboxos",
             stdout=PIPE,
             stderr=PIPE
         )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,26 @@
 #!/bin/bash
 
-CONFIG_FILE="/home/seluser/.config/select_freeboxos/cron_docker.conf"
-TIMESTAMP_FILE="/home/seluser/.local/share/select_freeboxos/last_update_check"
-
-START_FREEBOXOS="true"
-AUTO_UPDATE="false"
-
-while true; do
-    if [ -f "$CONFIG_FILE" ]; then
-        source "$CONFIG_FILE"
-    else
-        echo "Warning: Config file not found. Using default values." >> /var/log/select_freeboxos/auto_update.log 2>&1
-    fi
-
-    if [ "$AUTO_UPDATE" = "true" ]; then
-        CURRENT_TIME=$(date +%s)
-
-        LAST_UPDATE=$(cat "$TIMESTAMP_FILE" 2>/dev/null || echo 0)
-
-        if (( CURRENT_TIME - LAST_UPDATE >= 86400 )); then
-            echo "[$(date)] Starting daily auto-update check" >> /var/log/select_freeboxos/auto_update.log 2>&1
-            cd /home/seluser/select-freeboxos && bash auto_update.sh >> /var/log/select_freeboxos/auto_update.log 2>&1
-
-            echo "$CURRENT_TIME" > "$TIMESTAMP_FILE"
-        fi
-    fi
-
-    sleep 150
-
-    if [ "$START_FREEBOXOS" = "true" ]; then
-        /home/seluser/.venv/bin/python3 /home/seluser/select-freeboxos/cron_docker.py >> /var/log/select_freeboxos/select_freeboxos.log 2>&1
-    fi
-
-    sleep 150
+# scheduler_daemon.py refreshes the programmes and programs the recordings
+# every 5 minutes in a single resident process. It exits after installing a
+# new release (or on a fatal error) and is started again here. SIGTERM and
+# SIGINT (docker stop) are forwarded to it and end the loop. Its output goes
+# to cron_freeboxos.log: select_freeboxos.log is written by its log handler.
+
+stopping=0
+pid=
+trap 'stopping=1; [ -n "$pid" ] && kill -TERM "$pid" 2>/dev/null' TERM INT
+
+while [ "$stopping" = 0 ]; do
+    /home/seluser/.venv/bin/python3 /home/seluser/select-freeboxos/scheduler_daemon.py >> /var/log/select_freeboxos/cron_freeboxos.log 2>&1 &
+    pid=$!
+    # wait returns as soon as the trap has run: wait again for the scheduler
+    # to close its browser session and its recordings store
+    while kill -0 "$pid" 2>/dev/null; do
+        wait "$pid"
+    done
+    pid=
+    [ "$stopping" = 0 ] || break
+
+    sleep 10 &
+    wait $!
 done
@@ -0,0 +1,103 @@
+import re
+
+from datetime import date, timedelta
+
+MONTH_LABELS = {
+    "Jan": 1,
+    "Fév": 2,
+    "Mar": 3,
+    "Avr": 4,
+    "Mai": 5,
+    "Juin": 6,
+    "Juil": 7,
+    "Août": 8,
+    "Sept": 9,
+    "Oct": 10,
+    "Nov": 11,
+    "Déc": 12,
+}
+
+DAY_MONTH_RE = re.compile(
+    r"\b(\d{1,2}) (" + "|".join(sorted(MONTH_LABELS, key=len, reverse=True)) + r")\b"
+)
+
+# Text of the visible <li> entries, read in a single WebDriver call
+VISIBLE_ITEMS_SCRIPT = (
+    "return Array.from(document.querySelectorAll('li'))"
+    ".filter(li => li.offsetParent !== null)"
+    ".map(li => li.textContent);"
+)
+
+
+def label_date(label, today):
+    """Date of an entry of the Freebox OS date picker, or None."""
+    if "TV" in label:
+        return None
+    if "Aujourd" in label:
+        return today
+    if "Demain" in label:
+        return today + timedelta(days=1)
+    if "jours" in label:
+        return today + timedelta(days=2)
+
+    match = DAY_MONTH_RE.search(label)
+    if not match:
+        return None
+    day, month = int(match.group(1)), MONTH_LABELS[match.group(2)]
+    try:
+        found = date(today.year, month, day)
+        if found < today:
+            found = date(today.year + 1, month, day)
+    except ValueError:
+        return None
+    return found
+
+
+def xpath_literal(text):
+    """XPath string literal for text, which may contain quotes."""
+    if "'" not in text:
+        return f"'{text}'"
+    if '"' not in text:
+        return f'"{text}"'
+    parts = text.split("'")
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in parts) + ")"
+
+
+class DatePickerLabels:
+    """
+    Map of the dates offered by the date picker of the recording form to
+    their label. It is read once per day from an open picker, so that a
+    date missing from the picker is known before opening the form again.
+    """
+
+    def __init__(self):
+        self.day = None
+        self.labels = {}
+
+    def is_current(self, today):
+        return self.day == today
+
+    def load(self, item_texts, today):
+        self.labels = {}
+        for text in item_texts:
+            label = " ".join(text.split())
+            found = label_date(label, today)
+            if found is not None:
+                self.labels.setdefault(found, label)
+        # Read again at the next recording if the picker was not rendered yet
+        self.day = today if self.labels else None
+        return self.labels
+
+    def read(self, driver, today):
+        """Load the labels of the date picker currently open in driver."""
+        return self.load(driver.execute_script(VISIBLE_ITEMS_SCRIPT), today)
+
+    def label(self, day):
+        return self.labels.get(day)
+
+    def xpath(self, day):
+        """XPath of the picker entry of day, or None if it is not offered."""
+        label = self.label(day)
+        if label is None:
+            return None
+        return f"//li[normalize-space(.)={xpath_literal(label)}]"
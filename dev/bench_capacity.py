@@ -0,0 +1,82 @@
+"""
+Benchmark of the MAX_SIM_RECORDINGS check over synthetic recordings.
+
+Compares recording_capacity.RecordingCapacity with an exact linear scan of
+all scheduled recordings, and checks that both take the same decisions:
+
+    python3 dev/bench_capacity.py --sizes 1000 5000 20000
+"""
+import argparse
+import os
+import random
+import sys
+
+from datetime import datetime, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recording_capacity import RecordingCapacity
+
+
+def synthetic_recordings(count, seed):
+    """Programmes spread over count / 4 days, 5 min to 3 h long."""
+    rng = random.Random(seed)
+    origin = datetime(2026, 1, 1, 6, 0)
+    span = max(1, count // 4) * 24 * 60
+    recordings = []
+    for _ in range(count):
+        start = origin + timedelta(minutes=rng.randrange(span))
+        end = start + timedelta(minutes=rng.randint(5, 180))
+        recordings.append((start, end))
+    return recordings
+
+
+class LinearCapacity:
+    """Exact reference check scanning every scheduled recording."""
+
+    def __init__(self, max_simultaneous):
+        self.max_simultaneous = max_simultaneous
+        self.intervals = []
+
+    def try_add(self, start, end):
+        instants = [start] + [s for s, _ in self.intervals if start < s < end]
+        for instant in instants:
+            running = sum(1 for s, e in self.intervals if s <= instant < e)
+            if running >= self.max_simultaneous:
+                return False
+        self.intervals.append((start, end))
+        return True
+
+
+def run(capacity, recordings):
+    started = perf_counter()
+    decisions = [capacity.try_add(start, end) for start, end in recordings]
+    return perf_counter() - started, decisions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--max-sim", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--linear-limit", type=int, default=5000,
+                        help="skip the linear scan above this size")
+    args = parser.parse_args()
+
+    print(f"{'recordings':>10} {'accepted':>9} {'index (s)':>10} {'linear (s)':>11} {'us/check':>9}")
+    for size in args.sizes:
+        recordings = synthetic_recordings(size, args.seed)
+        index_time, decisions = run(RecordingCapacity(args.max_sim), recordings)
+
+        linear = "-"
+        if size <= args.linear_limit:
+            linear_time, expected = run(LinearCapacity(args.max_sim), recordings)
+            if decisions != expected:
+                sys.exit(f"Decisions differ from the linear scan for {size} recordings")
+            linear = f"{linear_time:.3f}"
+
+        print(
+            f"{size:>10} {sum(decisions):>9} {index_time:>10.3f} {linear:>11} "
+            f"{index_time / size * 1e6:>9.1f}"
+        )
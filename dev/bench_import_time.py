@@ -0,0 +1,81 @@
+"""
+Cold-start import cost of the entry points, measured with python -X importtime.
+
+Each module is imported in a fresh interpreter several times and the median
+cumulative import time is reported, with the heaviest dependencies:
+
+    python3 dev/bench_import_time.py --modules cron_docker freeboxos --runs 5
+
+Exits with status 1 when a module exceeds --budget-ms, so that it can be
+used to catch startup regressions.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr):
+    """Map module -> (self us, cumulative us) from -X importtime output."""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        name = fields[2].strip()
+        timings[name] = (int(fields[0]), int(fields[1]))
+    return timings
+
+
+def import_timings(module, python=sys.executable):
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        last_line = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+        raise RuntimeError(f"import {module} failed: {last_line}")
+    return parse_importtime(result.stderr)
+
+
+def top_level_cost(timings):
+    """Cumulative time of every top-level package, heaviest first."""
+    packages = {}
+    for name, (_, cumulative) in timings.items():
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), cumulative)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["cron_docker", "freeboxos"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail when the median import time exceeds this budget")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        runs = [import_timings(module) for _ in range(args.runs)]
+        median_ms = statistics.median(timings[module][1] for timings in runs) / 1000
+
+        print(f"{module}: {median_ms:.1f} ms (median of {args.runs} cold imports)")
+        for package, cumulative in top_level_cost(runs[-1])[:args.top]:
+            if package != module:
+                print(f"    {package:<24} {cumulative / 1000:>8.1f} ms")
+
+        if args.budget_ms is not None and median_ms > args.budget_ms:
+            over_budget.append(module)
+
+    if over_budget:
+        sys.exit(f"Over the {args.budget_ms} ms budget: {', '.join(over_budget)}")
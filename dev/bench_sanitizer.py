@@ -0,0 +1,127 @@
+"""
+Benchmark of the log scrubbing of security_sanitizer.SensitiveDataFilter.
+
+Filters realistic log records with the single-pass scrubber and its cache
+of scrubbed format strings, and with the previous implementation (one
+re.sub per keyword found, then one pass per secret), checks that both
+produce the same messages, also on EDGE_CASES, and reports records per
+second:
+
+    python3 dev/bench_sanitizer.py --records 50000
+"""
+import argparse
+import logging
+import os
+import random
+import re
+import sys
+
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from security_sanitizer import SensitiveDataFilter
+
+SECRETS = {
+    "admin_password": "Sup3r-Secret!",
+    "freebox_ip": "192.168.1.254",
+    "freebox_app_token": "dyNYgfK0Ya6FWGqq83sBHa7TwzWo+pg4fDFUJHShcjVYzTfaRrZzm93p7OTAfH/0",
+}
+
+LOG_LINES = [
+    ("Programmes: %s new, %s removed, %s unchanged.", (3, 1, 42)),
+    ("Le programme %s sur la chaîne %s n'a pas pu être programmé.", ("Journal", "TF1")),
+    ("Impossible to connect to http://192.168.1.254/#Fbx.os.app.pvr.app", ()),
+    ("Le mot de passe administrateur de la Freebox est invalide. "
+     "La programmation des enregistrements n'a pas pu être réalisée.", ()),
+    ("Freebox API login failed: auth_required: password=Sup3r-Secret! rejected", ()),
+    ("Freebox app token %s refused", (SECRETS["freebox_app_token"],)),
+    ("No data to record programmes. Exit programme.", ()),
+    ("Exception message: %s", ("Message: Unable to locate element: //span[text()='Sauvegarder']",)),
+    ("Data downloaded successfully.", ()),
+    ("Authorization: Bearer abcdef0123456789 sent to %s", (SECRETS["freebox_ip"],)),
+]
+
+# (secrets, text) where a secret and a keyword rule overlap
+EDGE_CASES = [
+    ({"admin_password": "mypassword"}, "mypassword=hunter2"),
+    ({"admin_password": "mypassword"}, "login mypassword: hunter2, retry"),
+    ({"freebox_app_token": "abctoken"}, "auth = abctoken = hunter2"),
+    ({"freebox_ip": "192.168.1.254"}, "auth = xtoken = hunter2"),
+]
+
+
+class LegacyFilter(SensitiveDataFilter):
+    """Scrubbing as done before the single-pass scrubber and message cache."""
+
+    def _set_scrubber(self, scrubber):
+        super()._set_scrubber(scrubber)
+        self._scrub_msg = self._scrub_string
+
+    def update_patterns(self, secrets):
+        super().update_patterns(secrets)
+        self.secret_patterns = [
+            re.compile(re.escape(str(value))) for value in secrets.values() if value
+        ]
+
+    def _scrub_string(self, text):
+        if not text:
+            return text
+
+        lowered = text.lower()
+        for word in self.GENERIC_SENSITIVE_WORDS:
+            if word in lowered:
+                text = re.sub(
+                    r"(?i)(" + re.escape(word) + r")\s*[:=]\s*[^\s,]+",
+                    r"\1=[REDACTED]",
+                    text,
+                )
+        for pattern in self.secret_patterns:
+            text = pattern.sub("[REDACTED]", text)
+        return text
+
+
+def make_records(count, seed):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        msg, args = rng.choice(LOG_LINES)
+        records.append(logging.LogRecord("module_freeboxos", logging.ERROR, __file__, 0, msg, args, None))
+    return records
+
+
+def run(log_filter, records):
+    started = perf_counter()
+    for record in records:
+        log_filter.filter(record)
+    elapsed = perf_counter() - started
+    return elapsed, [record.getMessage() for record in records]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="best of this many runs")
+    args = parser.parse_args()
+
+    def best_run(filter_class):
+        runs = [
+            run(filter_class(SECRETS), make_records(args.records, args.seed))
+            for _ in range(args.repeat)
+        ]
+        return min(elapsed for elapsed, _ in runs), runs[0][1]
+
+    for secrets, text in EDGE_CASES:
+        if SensitiveDataFilter(secrets)._scrub_string(text) != LegacyFilter(secrets)._scrub_string(text):
+            sys.exit(f"Scrubbed text differs from the previous implementation: {text!r}")
+
+    legacy_time, expected = best_run(LegacyFilter)
+    single_time, messages = best_run(SensitiveDataFilter)
+
+    if messages != expected:
+        sys.exit("Scrubbed messages differ from the previous implementation")
+
+    print(f"{'scrubber':<12} {'time (s)':>9} {'records/s':>11}")
+    for name, elapsed in (("previous", legacy_time), ("current", single_time)):
+        print(f"{name:<12} {elapsed:>9.3f} {args.records / elapsed:>11.0f}")
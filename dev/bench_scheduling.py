@@ -0,0 +1,139 @@
+"""
+End-to-end benchmark of the Selenium scheduling against the local Freebox
+OS stand-in (dev/mock_freebox_os.py).
+
+Schedules synthetic recordings through freeboxos.schedule_with_selenium()
+with a local Firefox, and reports the seconds per recording (browser
+start and login excluded) and the p50/p95 of each step from the run trace:
+
+    python3 dev/bench_scheduling.py --recordings 20 --latency 0.1
+
+Needs Firefox and geckodriver, as in the container, but no Freebox and no
+network access.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from datetime import datetime, timedelta
+from time import perf_counter, time
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import freeboxos
+
+from mock_freebox_os import DEFAULT_PASSWORD, PICKER_DAYS, start_server
+from recordings_store import RecordingStore
+from run_trace import STEPS, read_spans, summarize
+
+CHANNEL_NAMES = ("TF1", "France 2", "France 3", "France 5", "M6", "Arte")
+DURATIONS = (1800, 3600, 5400)
+
+
+def synthetic_programmes(count, seed, days=PICKER_DAYS):
+    """
+    MEDIA-select programmes starting from two hours from now to the last
+    day offered by the date picker, on the channels of the stand-in.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(ZoneInfo("Europe/Paris")).replace(tzinfo=None)
+    first = (now + timedelta(hours=2)).replace(minute=0, second=0, microsecond=0)
+    last = datetime.combine(now.date() + timedelta(days=days - 1), datetime.min.time())
+    last += timedelta(hours=22)
+    slots = max(1, int((last - first).total_seconds() // 300))
+
+    programmes = []
+    for index in range(count):
+        start = first + timedelta(minutes=5 * rng.randrange(slots))
+        programmes.append({
+            "id": index,
+            "title": f"Programme de test {index}",
+            "channel": rng.choice(CHANNEL_NAMES),
+            "start": start.strftime("%Y%m%d%H%M"),
+            "duration": rng.choice(DURATIONS),
+        })
+    return programmes
+
+
+def bench_config(address, headless, titles):
+    return {
+        "ADMIN_PASSWORD": DEFAULT_PASSWORD,
+        "FREEBOX_SERVER_IP": address,
+        "MEDIA_SELECT_TITLES": titles,
+        "MAX_SIM_RECORDINGS": 1000,
+        "HTTPS": False,
+        "SENTRY_MONITORING_SDK": False,
+        "SECURITY_STRICT_MODE": False,
+        "RESIDENT_BROWSER": False,
+        "HEADLESS_BROWSER": headless,
+    }
+
+
+def run(args):
+    server, address = start_server(latency=args.latency, fail_every=args.fail_every)
+    freeboxos.configure(bench_config(address, not args.headed, not args.no_titles))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_file = os.path.join(tmp, "trace.jsonl")
+        freeboxos.tracer.path = trace_file
+
+        with RecordingStore(os.path.join(tmp, "recordings.db")) as store:
+            store.sync(synthetic_programmes(args.recordings, args.seed))
+            store.begin_run()
+            recordings = freeboxos.order_for_form(
+                freeboxos.plan_recordings(store.pending(), [], store)
+            )
+
+            freeboxos.tracer.begin_run()
+            started = perf_counter()
+            try:
+                freeboxos.schedule_with_selenium(recordings, store)
+            finally:
+                elapsed = perf_counter() - started
+                finished = time()
+                freeboxos.tracer.end_run()
+
+            statuses = dict(store.conn.execute(
+                "SELECT status, COUNT(*) FROM programmes GROUP BY status"
+            ).fetchall())
+
+        spans = read_spans(trace_file)
+
+    server.shutdown()
+
+    logins = [span for span in spans if span["name"] == "login"]
+    login = sum(span["duration"] for span in logins)
+    # From the end of the login, the browser start being excluded too
+    forms_started = logins[0]["start"] + logins[0]["duration"] if logins else finished - elapsed
+    per_recording = (finished - forms_started) / max(1, len(recordings))
+
+    print(f"recordings          {len(recordings)}")
+    print(f"saved on the box    {len(server.state.programmed)}")
+    print("store statuses      " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items())))
+    print(f"total               {elapsed:.2f} s (login {login:.2f} s)")
+    print(f"per recording       {per_recording:.3f} s")
+    print()
+
+    summary = summarize(spans)
+    print(f"{'step':<12} {'count':>6} {'p50 (s)':>9} {'p95 (s)':>9}")
+    for name in STEPS:
+        if name in summary:
+            count, p50, p95 = summary[name]
+            print(f"{name:<12} {count:>6} {p50:>9.3f} {p95:>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recordings", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added by the stand-in to each response and dialog update")
+    parser.add_argument("--fail-every", type=int, default=0,
+                        help="answer the Nth save with 'Erreur interne', which ends the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--headed", action="store_true", help="show the browser")
+    parser.add_argument("--no-titles", action="store_true",
+                        help="do not type the MEDIA-select titles")
+    run(parser.parse_args())
@@ -0,0 +1,93 @@
+"""
+Benchmark of security_sanitizer.scrub_event on a synthetic Sentry event.
+
+Builds an event with a deep stack trace (vars, context lines) and
+breadcrumbs, scrubs it and checks that no secret, username or hostname is
+left in it:
+
+    python3 dev/bench_scrub_event.py --frames 500 --runs 20
+"""
+import argparse
+import copy
+import json
+import os
+import socket
+import sys
+
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from security_sanitizer import global_sanitizer, scrub_event
+
+SECRETS = {
+    "admin_password": "Sup3r-Secret!",
+    "freebox_ip": "192.168.1.254",
+    "freebox_app_token": "dyNYgfK0Ya6FWGqq83sBHa7TwzWo+pg4fDFUJHShcjVYzTfaRrZzm93p7OTAfH/0",
+}
+
+
+def synthetic_event(frames):
+    hostname = socket.gethostname()
+    path = "/home/seluser/select-freeboxos/freeboxos.py"
+    return {
+        "server_name": hostname,
+        "exception": {"values": [{
+            "type": "WebDriverException",
+            "value": f"Failed to reach http://{SECRETS['freebox_ip']}/ from {hostname}",
+            "stacktrace": {"frames": [
+                {
+                    "filename": path,
+                    "abs_path": path,
+                    "function": f"step_{i}",
+                    "context_line": f"    login.send_keys('{SECRETS['admin_password']}')",
+                    "pre_context": [f"# frame {i}", f"url = 'http://{SECRETS['freebox_ip']}'"],
+                    "post_context": ["driver.quit()"],
+                    "vars": {
+                        "url": f"http://{SECRETS['freebox_ip']}/#Fbx.os.app.pvr.app",
+                        "headers": {"X-Fbx-App-Auth": SECRETS["freebox_app_token"]},
+                        "recordings": [
+                            {"channel": "TF1", "path": path, "password": SECRETS["admin_password"]},
+                            {"channel": "France 2", "start": "202612012045"},
+                        ],
+                        "attempt": i,
+                    },
+                }
+                for i in range(frames)
+            ]},
+        }]},
+        "breadcrumbs": {"values": [
+            {"type": "http", "data": {"url": f"http://{SECRETS['freebox_ip']}/api/v8/login/"}},
+            {"type": "default", "message": f"token={SECRETS['freebox_app_token']}",
+             "data": {"items": [{"path": path}]}},
+            {"type": "subprocess", "message": "bash cron_freeboxos_app.sh"},
+        ] * (frames // 10 or 1)},
+        "extra": {"sys.argv": ["freeboxos.py"], "cwd": "/home/seluser/select-freeboxos"},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    global_sanitizer.update_patterns(SECRETS)
+    event = synthetic_event(args.frames)
+    events = [copy.deepcopy(event) for _ in range(args.runs)]
+
+    timings = []
+    for event in events:
+        started = perf_counter()
+        scrub_event(event, None)
+        timings.append(perf_counter() - started)
+
+    dump = json.dumps(events[0])
+    leaks = [value for value in list(SECRETS.values()) + ["seluser", socket.gethostname()]
+             if value in dump]
+    if leaks:
+        sys.exit(f"Values left in the scrubbed event: {leaks}")
+
+    timings.sort()
+    print(f"{args.frames} frames, {len(dump)} bytes scrubbed")
+    print(f"best {timings[0] * 1000:.2f} ms, median {timings[len(timings) // 2] * 1000:.2f} ms")
@@ -0,0 +1,155 @@
+"""
+Local stand-in for the Freebox OS HTTP API.
+
+Emulates the endpoints used by freebox_api.FreeboxAPIClient (login
+challenge/session, TV bouquet channels, pvr/programmed) so that the API
+backend can be exercised without a Freebox:
+
+    python3 dev/mock_freebox_api.py --port 8089 --app-token test-token
+
+then point FreeboxAPIClient("http://127.0.0.1:8089", "test-token") at it.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PATH = "/api/v8"
+
+CHANNELS = [
+    {"uuid": "uuid-webtv-201", "number": 1, "sub_number": 0, "name": "TF1"},
+    {"uuid": "uuid-webtv-202", "number": 2, "sub_number": 0, "name": "France 2"},
+    {"uuid": "uuid-webtv-203", "number": 3, "sub_number": 0, "name": "France 3"},
+    {"uuid": "uuid-webtv-205", "number": 5, "sub_number": 0, "name": "France 5"},
+    {"uuid": "uuid-webtv-206", "number": 6, "sub_number": 0, "name": "M6"},
+    {"uuid": "uuid-webtv-207", "number": 7, "sub_number": 0, "name": "Arte"},
+]
+
+
+class MockFreeboxState:
+    def __init__(self, app_token, channels=None):
+        self.app_token = app_token
+        self.channels = channels if channels is not None else CHANNELS
+        self.challenge = secrets.token_hex(16)
+        self.sessions = set()
+        self.programmed = []
+        self.lock = threading.Lock()
+
+
+class MockFreeboxHandler(BaseHTTPRequestHandler):
+    server_version = "MockFreebox/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _send(self, status, body, content_type="application/json"):
+        if content_type == "application/json":
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _ok(self, result=None):
+        self._send(200, {"success": True, "result": result})
+
+    def _error(self, status, error_code, msg=""):
+        self._send(status, {"success": False, "error_code": error_code, "msg": msg})
+
+    def _authenticated(self):
+        token = self.headers.get("X-Fbx-App-Auth")
+        if token not in self.state.sessions:
+            self._error(403, "auth_required", "Invalid session token, or not session token sent")
+            return False
+        return True
+
+    def _payload(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+
+        if path == "/":
+            self._send(200, b"<html><head><title>Freebox OS</title></head></html>", "text/html")
+        elif path == API_PATH + "/login/":
+            self._ok({"logged_in": False, "challenge": self.state.challenge})
+        elif path == API_PATH + "/tv/bouquets/freeboxtv/channels/":
+            if self._authenticated():
+                self._ok(self.state.channels)
+        elif path == API_PATH + "/pvr/programmed/":
+            if self._authenticated():
+                with self.state.lock:
+                    self._ok(list(self.state.programmed))
+        else:
+            self._error(404, "invalid_request", "Unknown endpoint")
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        payload = self._payload()
+
+        if path == API_PATH + "/login/session/":
+            expected = hmac.new(
+                self.state.app_token.encode(),
+                self.state.challenge.encode(),
+                hashlib.sha1,
+            ).hexdigest()
+            if payload.get("password") != expected:
+                self._error(403, "invalid_token", "The app token you are trying to use is invalid")
+                return
+            session_token = secrets.token_hex(16)
+            self.state.sessions.add(session_token)
+            self._ok({"session_token": session_token, "challenge": self.state.challenge,
+                      "permissions": {"pvr": True, "tv": True}})
+        elif path == API_PATH + "/login/logout/":
+            self.state.sessions.discard(self.headers.get("X-Fbx-App-Auth"))
+            self._ok()
+        elif path == API_PATH + "/pvr/programmed/":
+            if not self._authenticated():
+                return
+            uuids = {channel["uuid"] for channel in self.state.channels}
+            if payload.get("channel_uuid") not in uuids or payload.get("end", 0) <= payload.get("start", 0):
+                self._error(400, "invalid_request", "Invalid request")
+                return
+            with self.state.lock:
+                record = dict(payload, id=len(self.state.programmed) + 1, state="waiting_start_time")
+                self.state.programmed.append(record)
+            self._ok(record)
+        else:
+            self._error(404, "invalid_request", "Unknown endpoint")
+
+
+def start_server(app_token, host="127.0.0.1", port=0, channels=None):
+    """Start the stand-in server in a thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), MockFreeboxHandler)
+    server.state = MockFreeboxState(app_token, channels)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--app-token", default="test-token")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), MockFreeboxHandler)
+    server.state = MockFreeboxState(args.app_token)
+    print(f"Mock Freebox API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
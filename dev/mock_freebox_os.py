@@ -0,0 +1,309 @@
+"""
+Local stand-in for the Freebox OS web interface.
+
+Reproduces what freeboxos.schedule_with_selenium() drives: the login form
+(fbx-password, "Identifiants invalides"), the PVR application with its
+"Programmer un enregistrement" button and dialog (channel_uuid, date
+picker, start_time, end_time, name, "Sauvegarder", "Annuler") and the
+"Erreur interne" banner, so that the Selenium path can be run and timed
+without a Freebox:
+
+    python3 dev/mock_freebox_os.py --port 8090 --latency 0.2 --fail-every 10
+
+then set FREEBOX_SERVER_IP to "127.0.0.1:8090" with HTTPS false. The
+recordings saved through the dialog are listed as JSON at /programmed.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from date_picker import MONTH_LABELS
+from mock_freebox_api import CHANNELS
+
+DEFAULT_PASSWORD = "test-password"
+
+# Days offered by the date picker of the dialog, today included
+PICKER_DAYS = 8
+
+WEEKDAY_LABELS = ("Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim")
+MONTH_NAMES = {number: label for label, number in MONTH_LABELS.items()}
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Freebox OS</title>
+<style>
+  .hidden { display: none; }
+  .dialog { border: 1px solid #888; padding: 1em; }
+  .error { color: #c00; }
+  .button { cursor: pointer; border: 1px solid #888; padding: 0 .5em; }
+  ul.picker li { cursor: pointer; }
+</style>
+</head>
+<body>
+<div id="login">
+  <input id="fbx-password" type="password">
+</div>
+<div id="pvr" class="hidden">
+  <span id="programmer" class="button">Programmer un enregistrement</span>
+  <div id="dialog" class="dialog hidden">
+    <input name="channel_uuid" autocomplete="off">
+    <input name="date" readonly>
+    <ul id="picker" class="picker hidden"></ul>
+    <input name="start_time" autocomplete="off">
+    <input name="end_time" autocomplete="off">
+    <input name="name" autocomplete="off">
+    <span id="save" class="button">Sauvegarder</span>
+    <span id="cancel" class="button">Annuler</span>
+  </div>
+</div>
+<script>
+const LATENCY_MS = __LATENCY_MS__;
+const CHANNELS = __CHANNELS__;
+const DAYS = __DAYS__;
+
+const $ = (selector) => document.querySelector(selector);
+const field = (name) => document.querySelector(`#dialog input[name="${name}"]`);
+const later = (fn) => setTimeout(fn, LATENCY_MS);
+
+function post(path, body) {
+  return fetch(path, {method: "POST", body: JSON.stringify(body)});
+}
+
+function banner(parent, text) {
+  const div = document.createElement("div");
+  div.className = "error";
+  div.textContent = text;
+  parent.appendChild(div);
+}
+
+function clearBanners(parent) {
+  parent.querySelectorAll(".error").forEach((div) => div.remove());
+}
+
+$("#fbx-password").addEventListener("keydown", (event) => {
+  if (event.key !== "Enter") return;
+  clearBanners($("#login"));
+  post("/login", {password: event.target.value}).then((response) => {
+    if (response.ok) {
+      $("#login").classList.add("hidden");
+      $("#pvr").classList.remove("hidden");
+    } else {
+      banner($("#login"), "Identifiants invalides");
+    }
+  });
+});
+
+$("#programmer").addEventListener("click", () => {
+  later(() => {
+    clearBanners($("#dialog"));
+    ["channel_uuid", "date", "start_time", "end_time", "name"].forEach(
+      (name) => { field(name).value = ""; }
+    );
+    $("#picker").classList.add("hidden");
+    $("#dialog").classList.remove("hidden");
+  });
+});
+
+field("channel_uuid").addEventListener("keydown", (event) => {
+  if (event.key !== "Enter") return;
+  const input = event.target;
+  later(() => {
+    const number = input.value.trim().split("/")[0];
+    const channel = CHANNELS.find((c) => String(c.number) === number);
+    if (channel) input.value = `${channel.number}/${channel.name}`;
+  });
+});
+
+field("date").addEventListener("click", () => {
+  later(() => {
+    const picker = $("#picker");
+    picker.innerHTML = "";
+    DAYS.forEach(([day, label]) => {
+      const li = document.createElement("li");
+      li.textContent = label;
+      li.addEventListener("click", () => {
+        field("date").value = day;
+        picker.classList.add("hidden");
+      });
+      picker.appendChild(li);
+    });
+    picker.classList.remove("hidden");
+  });
+});
+
+$("#cancel").addEventListener("click", () => {
+  $("#dialog").classList.add("hidden");
+});
+
+$("#save").addEventListener("click", () => {
+  clearBanners($("#dialog"));
+  const recording = {};
+  ["channel_uuid", "date", "start_time", "end_time", "name"].forEach(
+    (name) => { recording[name] = field(name).value; }
+  );
+  post("/save", recording).then((response) => {
+    if (response.ok) {
+      $("#dialog").classList.add("hidden");
+    } else if (response.status === 400) {
+      banner($("#dialog"), "Paramètres invalides");
+    } else {
+      banner($("#dialog"), "Erreur interne");
+    }
+  });
+});
+</script>
+</body>
+</html>
+"""
+
+
+def picker_days(today, days=PICKER_DAYS):
+    """(ISO date, label) of the date picker entries, as Freebox OS words them."""
+    entries = []
+    for offset in range(days):
+        day = today + timedelta(days=offset)
+        if offset == 0:
+            label = "Aujourd'hui"
+        elif offset == 1:
+            label = "Demain"
+        elif offset == 2:
+            label = "Dans 2 jours"
+        else:
+            label = f"{WEEKDAY_LABELS[day.weekday()]} {day.day} {MONTH_NAMES[day.month]}"
+        entries.append((day.isoformat(), label))
+    return entries
+
+
+class MockFreeboxOSState:
+    def __init__(self, password=DEFAULT_PASSWORD, latency=0.0, fail_every=0,
+                 channels=None, days=PICKER_DAYS):
+        self.password = password
+        self.latency = latency
+        self.fail_every = fail_every
+        self.channels = channels if channels is not None else CHANNELS
+        self.days = days
+        self.saves = 0
+        self.programmed = []
+        self.lock = threading.Lock()
+
+    def page(self):
+        today = datetime.now(ZoneInfo("Europe/Paris")).date()
+        channels = [{"number": c["number"], "name": c["name"]} for c in self.channels]
+        return (
+            PAGE.replace("__LATENCY_MS__", str(int(self.latency * 1000)))
+            .replace("__CHANNELS__", json.dumps(channels))
+            .replace("__DAYS__", json.dumps(picker_days(today, self.days)))
+        )
+
+    def save(self, recording):
+        """HTTP status of the save of the recording dialog."""
+        numbers = {str(c["number"]) for c in self.channels}
+        channel = str(recording.get("channel_uuid", "")).split("/")[0]
+        start, end = recording.get("start_time", ""), recording.get("end_time", "")
+        if channel not in numbers or not recording.get("date") or not start or start == end:
+            return 400
+
+        with self.lock:
+            self.saves += 1
+            if self.fail_every and self.saves % self.fail_every == 0:
+                return 500
+            self.programmed.append(dict(recording, id=len(self.programmed) + 1))
+        return 200
+
+
+class MockFreeboxOSHandler(BaseHTTPRequestHandler):
+    server_version = "MockFreeboxOS/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _send(self, status, body, content_type="application/json"):
+        if content_type == "application/json":
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _payload(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+
+        if path in ("/", "/login.php"):
+            self._send(200, self.state.page().encode(), "text/html; charset=utf-8")
+        elif path == "/programmed":
+            with self.state.lock:
+                self._send(200, list(self.state.programmed))
+        else:
+            self._send(404, {"error": "not_found"})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        payload = self._payload()
+        time.sleep(self.state.latency)
+
+        if path == "/login":
+            if payload.get("password") == self.state.password:
+                self._send(200, {"success": True})
+            else:
+                self._send(403, {"success": False})
+        elif path == "/save":
+            status = self.state.save(payload)
+            self._send(status, {"success": status == 200})
+        else:
+            self._send(404, {"error": "not_found"})
+
+
+def start_server(host="127.0.0.1", port=0, **state_options):
+    """Start the stand-in server in a thread. Returns (server, address)."""
+    server = ThreadingHTTPServer((host, port), MockFreeboxOSHandler)
+    server.state = MockFreeboxOSState(**state_options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to each response and dialog update")
+    parser.add_argument("--fail-every", type=int, default=0,
+                        help="answer every Nth save with 'Erreur interne'")
+    args = parser.parse_args()
+
+    server, address = start_server(
+        args.host, args.port, password=args.password,
+        latency=args.latency, fail_every=args.fail_every,
+    )
+    print(f"Mock Freebox OS listening on http://{address}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,62 @@
+from selenium import webdriver
+
+WINDOW_WIDTH = 1920
+WINDOW_HEIGHT = 1080
+
+# Freebox OS only needs its DOM and scripts to be driven by Selenium: images,
+# web fonts, animations and background services are disabled to save RAM and
+# CPU on small hosts.
+LIGHTWEIGHT_PREFS = {
+    # Assets
+    "permissions.default.image": 2,
+    "gfx.downloadable_fonts.enabled": False,
+    "browser.display.use_document_fonts": 0,
+    "media.autoplay.default": 5,
+    # Animations and scrolling
+    "toolkit.cosmeticAnimations.enabled": False,
+    "ui.prefersReducedMotion": 1,
+    "general.smoothScroll": False,
+    "layout.frame_rate": 30,
+    # Content processes
+    "dom.ipc.processCount": 1,
+    "dom.ipc.processCount.webIsolated": 1,
+    "dom.ipc.processPrelaunch.enabled": False,
+    "fission.autostart": False,
+    # Telemetry and background services
+    "toolkit.telemetry.enabled": False,
+    "toolkit.telemetry.unified": False,
+    "toolkit.telemetry.archive.enabled": False,
+    "datareporting.healthreport.uploadEnabled": False,
+    "datareporting.policy.dataSubmissionEnabled": False,
+    "app.shield.optoutstudies.enabled": False,
+    "app.normandy.enabled": False,
+    "browser.ping-centre.telemetry": False,
+    "browser.newtabpage.activity-stream.feeds.telemetry": False,
+    "browser.newtabpage.activity-stream.telemetry": False,
+    "browser.safebrowsing.malware.enabled": False,
+    "browser.safebrowsing.phishing.enabled": False,
+    "extensions.update.enabled": False,
+    "app.update.auto": False,
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    # Cache and history
+    "browser.cache.disk.capacity": 51200,
+    "browser.cache.memory.capacity": 16384,
+    "browser.sessionhistory.max_entries": 5,
+    "browser.sessionstore.resume_from_crash": False,
+}
+
+
+def build_firefox_options(headless=True):
+    """Firefox options shared by every Selenium entry point."""
+    options = webdriver.FirefoxOptions()
+
+    if headless:
+        options.add_argument("-headless")
+    options.add_argument(f"--width={WINDOW_WIDTH}")
+    options.add_argument(f"--height={WINDOW_HEIGHT}")
+
+    for name, value in LIGHTWEIGHT_PREFS.items():
+        options.set_preference(name, value)
+
+    return options
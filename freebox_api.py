@@ -0,0 +1,255 @@
+import hashlib
+import hmac
+import json
+import os
+import requests
+import socket
+import sys
+
+from pathlib import Path
+from time import sleep
+
+
+CONFIG_PATH = Path("/home/seluser/.config/select_freeboxos/config.json")
+
+API_PATH = "/api/v8"
+DEFAULT_APP_ID = "fr.mediaselect.freeboxos"
+
+# Errors meaning that no further call can succeed in this run
+API_UNAVAILABLE_ERRORS = (
+    "auth_required",
+    "invalid_token",
+    "pending_token",
+    "insufficient_rights",
+    "denied_from_external_ip",
+    "ratelimited",
+    "no_app_token",
+)
+
+
+class FreeboxAPIError(Exception):
+    """Raised when the Freebox OS API answers with success=false."""
+
+    def __init__(self, error_code, msg=""):
+        super().__init__(f"{error_code}: {msg}")
+        self.error_code = error_code
+        self.msg = msg
+
+
+class FreeboxAPIClient:
+    """
+    Minimal Freebox OS REST API client used to program recordings.
+
+    Authentication follows the Freebox OS scheme: an app_token is obtained
+    once (see request_authorization()), then each session is opened by
+    answering the login challenge with HMAC-SHA1(app_token, challenge).
+    """
+
+    def __init__(self, base_url, app_token, app_id=DEFAULT_APP_ID, timeout=10, verify=True):
+        self.base_url = base_url.rstrip("/") + API_PATH
+        self.app_token = app_token
+        self.app_id = app_id
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.session_token = None
+        self._channel_uuids = None
+
+    def _request(self, method, path, payload=None, authenticated=True):
+        headers = {}
+        if authenticated:
+            if self.session_token is None:
+                self.login()
+            headers["X-Fbx-App-Auth"] = self.session_token
+
+        response = self.session.request(
+            method,
+            self.base_url + path,
+            json=payload,
+            headers=headers,
+            timeout=self.timeout,
+        )
+
+        try:
+            body = response.json()
+        except ValueError:
+            response.raise_for_status()
+            raise FreeboxAPIError("invalid_response", "Réponse non JSON")
+
+        if not body.get("success", False):
+            raise FreeboxAPIError(body.get("error_code", "unknown"), body.get("msg", ""))
+
+        return body.get("result")
+
+    def call(self, method, path, payload=None):
+        """Authenticated call, opening a new session once if it expired."""
+        try:
+            return self._request(method, path, payload)
+        except FreeboxAPIError as e:
+            if e.error_code not in ("auth_required", "invalid_session"):
+                raise
+            self.session_token = None
+            return self._request(method, path, payload)
+
+    def login(self):
+        """Open a session by answering the login challenge with the app_token."""
+        if not self.app_token:
+            raise FreeboxAPIError("no_app_token", "Aucun app_token configuré")
+
+        challenge = self._request("GET", "/login/", authenticated=False)["challenge"]
+        password = hmac.new(
+            self.app_token.encode(), challenge.encode(), hashlib.sha1
+        ).hexdigest()
+        result = self._request(
+            "POST",
+            "/login/session/",
+            {"app_id": self.app_id, "password": password},
+            authenticated=False,
+        )
+
+        if not result.get("permissions", {}).get("pvr", False):
+            raise FreeboxAPIError(
+                "insufficient_rights",
+                "L'application n'a pas la permission de programmer des enregistrements",
+            )
+
+        self.session_token = result["session_token"]
+
+    def logout(self):
+        if self.session_token is None:
+            return
+        try:
+            self._request("POST", "/login/logout/")
+        except (FreeboxAPIError, requests.RequestException):
+            pass
+        self.session_token = None
+
+    def _channels(self):
+        """Map channel number -> uuid of the Freebox TV bouquet."""
+        if self._channel_uuids is None:
+            channels = self.call("GET", "/tv/bouquets/freeboxtv/channels/") or []
+            self._channel_uuids = {}
+            for channel in channels:
+                if channel.get("sub_number", 0):
+                    continue
+                self._channel_uuids[str(channel["number"])] = channel["uuid"]
+        return self._channel_uuids
+
+    def channel_uuid(self, channel_number):
+        """Return the Freebox channel uuid for a channel number, or None."""
+        return self._channels().get(str(channel_number))
+
+    def channel_numbers(self):
+        """Map Freebox channel uuid -> channel number."""
+        return {uuid: number for number, uuid in self._channels().items()}
+
+    def programmed_recordings(self):
+        return self.call("GET", "/pvr/programmed/") or []
+
+    def program_recording(self, channel_number, start, end, name=None):
+        """
+        Program a recording on the Freebox. start and end are aware datetimes.
+        """
+        uuid = self.channel_uuid(channel_number)
+        if uuid is None:
+            raise FreeboxAPIError(
+                "unknown_channel", f"Chaîne n° {channel_number} absente du bouquet Freebox"
+            )
+
+        payload = {
+            "channel_uuid": uuid,
+            "start": int(start.timestamp()),
+            "end": int(end.timestamp()),
+            "margin_before": 0,
+            "margin_after": 0,
+        }
+        if name:
+            payload["name"] = name
+
+        return self.call("POST", "/pvr/programmed/", payload)
+
+    def request_authorization(self, app_name, app_version, device_name, poll_delay=2, max_polls=60):
+        """
+        Ask the Freebox for a new app_token. The request must be accepted on
+        the Freebox Server display. Returns the app_token once granted.
+        """
+        result = self._request(
+            "POST",
+            "/login/authorize/",
+            {
+                "app_id": self.app_id,
+                "app_name": app_name,
+                "app_version": app_version,
+                "device_name": device_name,
+            },
+            authenticated=False,
+        )
+        app_token = result["app_token"]
+        track_id = result["track_id"]
+
+        for _ in range(max_polls):
+            status = self._request(
+                "GET", f"/login/authorize/{track_id}", authenticated=False
+            )["status"]
+            if status == "granted":
+                self.app_token = app_token
+                return app_token
+            if status != "pending":
+                raise FreeboxAPIError(status, "Autorisation refusée sur la Freebox")
+            sleep(poll_delay)
+
+        raise FreeboxAPIError("timeout", "Autorisation non validée sur la Freebox")
+
+
+if __name__ == "__main__":
+    # Obtain an app_token and switch config.json to the API backend
+    with CONFIG_PATH.open(encoding="utf-8") as f:
+        config = json.load(f)
+
+    # With crypted credentials, config.json only holds placeholders
+    crypted_credentials = bool(config.get("CRYPTED_CREDENTIALS", False))
+    if crypted_credentials:
+        server_ip = os.getenv("FREEBOX_SERVER_IP")
+        if not server_ip:
+            print("Variable d'environnement FREEBOX_SERVER_IP absente.")
+            sys.exit(1)
+    else:
+        server_ip = config["FREEBOX_SERVER_IP"]
+
+    protocol = "https://" if config.get("HTTPS") else "http://"
+    client = FreeboxAPIClient(
+        protocol + server_ip,
+        None,
+        config.get("FREEBOX_APP_ID", DEFAULT_APP_ID),
+    )
+
+    print(
+        "Merci de valider la demande d'autorisation sur l'écran de la "
+        "Freebox Server (flèche droite puis OK)."
+    )
+    try:
+        app_token = client.request_authorization(
+            "select-freeboxos", "1.0", socket.gethostname()
+        )
+    except (FreeboxAPIError, requests.RequestException) as e:
+        print(f"L'autorisation a échoué: {e}")
+        sys.exit(1)
+
+    if not crypted_credentials:
+        config["FREEBOX_APP_TOKEN"] = app_token
+    config["SCHEDULER_BACKEND"] = "api"
+
+    with CONFIG_PATH.open("w", encoding="utf-8") as f:
+        json.dump(config, f, indent=4)
+    os.chmod(CONFIG_PATH, 0o600)
+
+    print(
+        "Autorisation accordée. Pensez à donner le droit \"Gestion de "
+        "l'enregistreur\" à l'application dans Freebox OS (Paramètres de "
+        "la Freebox > Gestion des accès > Applications)."
+    )
+    if crypted_credentials:
+        print(
+            "Ajoutez ce jeton à vos identifiants chiffrés, dans la variable "
+            f"d'environnement FREEBOX_APP_TOKEN: {app_token}"
+        )
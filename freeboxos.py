@@ -3,33 +3,47 @@ import json
 import logging
 import sys
 import os
-import shutil
 import socket
-import sentry_sdk
+import requests
 import re
+import urllib3
 
 from pathlib import Path
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from time import sleep
 from logging.handlers import RotatingFileHandler
-from selenium import webdriver
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import (
     NoSuchElementException,
+    TimeoutException,
     WebDriverException,
     ElementNotInteractableException,
     ElementClickInterceptedException
 )
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-from sentry_sdk.integrations.logging import LoggingIntegration
-
-from channels_free import CHANNELS_FREE
+import metrics
+
+from browser_session import DEFAULT_MAX_RSS_MB, DEFAULT_REMOTE_URL, BrowserSession
+from browser_waits import FORM_FIELD, StepWaits
+from channels_free import channel_number as find_channel_number, find_number_collisions
+from date_picker import DatePickerLabels
+from firefox_profile import build_firefox_options
+from freebox_api import (
+    API_UNAVAILABLE_ERRORS,
+    DEFAULT_APP_ID,
+    FreeboxAPIClient,
+    FreeboxAPIError,
+)
+from log_queue import start_queue_logging
 from module_freeboxos import get_website_title
+from recording_capacity import RecordingCapacity
+from programmes import fingerprint
+from reconciliation import ProgrammedRecordings
+from recording_order import order_recordings, transitions
+from recordings_store import FAILED, SCHEDULED, SKIPPED, RecordingStore
+from run_trace import TRACE_FILE, SpanTracer
 from security_sanitizer import global_sanitizer, scrub_event
 
 log_file = "/var/log/select_freeboxos/select_freeboxos.log"
@@ -44,87 +58,141 @@ formatter = logging.Formatter(log_format, log_datefmt)
 log_handler.setFormatter(formatter)
 
 logger = logging.getLogger("module_freeboxos")
-logger.addHandler(log_handler)
 
 sentry_handler = logging.StreamHandler()
 sentry_handler.setLevel(logging.WARNING)
 
 sensitive_filter = global_sanitizer
 
-log_handler.addFilter(sensitive_filter)
-sentry_handler.addFilter(sensitive_filter)
+# Records are scrubbed once and written by a background thread, away from
+# the thread driving Selenium
+start_queue_logging(logger, [log_handler, sentry_handler], sensitive_filter)
 
-logger.addHandler(sentry_handler)
 logger.setLevel(logging.INFO)
 
 CONFIG_PATH = Path("/home/seluser/.config/select_freeboxos/config.json")
 
-try:
-    with CONFIG_PATH.open(encoding="utf-8") as f:
-        config = json.load(f)
-except FileNotFoundError:
-    logger.error("config.json not found")
-    sys.exit(1)
-except json.JSONDecodeError as e:
-    logger.error("invalid config.json: %s", e)
-    sys.exit(1)
+def load_config():
+    try:
+        with CONFIG_PATH.open(encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.error("config.json not found")
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        logger.error("invalid config.json: %s", e)
+        sys.exit(1)
 
-try:
-    ADMIN_PASSWORD = config["ADMIN_PASSWORD"]
-    FREEBOX_SERVER_IP = config["FREEBOX_SERVER_IP"]
-    MEDIA_SELECT_TITLES = bool(config["MEDIA_SELECT_TITLES"])
-    MAX_SIM_RECORDINGS = int(config["MAX_SIM_RECORDINGS"])
-    HTTPS = bool(config["HTTPS"])
-    SENTRY_MONITORING_SDK = bool(config["SENTRY_MONITORING_SDK"])
-    CRYPTED_CREDENTIALS = bool(config.get("CRYPTED_CREDENTIALS", False))
-    SECURITY_STRICT_MODE = bool(config.get("SECURITY_STRICT_MODE", True))
-except KeyError as e:
-    logger.error("missing config key: %s", e)
-    sys.exit(1)
+def configure(config):
+    """Load the settings of config.json in the module globals."""
+    global ADMIN_PASSWORD, FREEBOX_SERVER_IP, MEDIA_SELECT_TITLES
+    global MAX_SIM_RECORDINGS, HTTPS, SENTRY_MONITORING_SDK, CRYPTED_CREDENTIALS
+    global SECURITY_STRICT_MODE, SCHEDULER_BACKEND, FREEBOX_APP_ID
+    global FREEBOX_APP_TOKEN, WAIT_TIMEOUTS, RESIDENT_BROWSER
+    global SELENIUM_REMOTE_URL, BROWSER_MAX_RSS_MB, HEADLESS_BROWSER
+
+    try:
+        ADMIN_PASSWORD = config["ADMIN_PASSWORD"]
+        FREEBOX_SERVER_IP = config["FREEBOX_SERVER_IP"]
+        MEDIA_SELECT_TITLES = bool(config["MEDIA_SELECT_TITLES"])
+        MAX_SIM_RECORDINGS = int(config["MAX_SIM_RECORDINGS"])
+        HTTPS = bool(config["HTTPS"])
+        SENTRY_MONITORING_SDK = bool(config["SENTRY_MONITORING_SDK"])
+        CRYPTED_CREDENTIALS = bool(config.get("CRYPTED_CREDENTIALS", False))
+        SECURITY_STRICT_MODE = bool(config.get("SECURITY_STRICT_MODE", True))
+        SCHEDULER_BACKEND = config.get("SCHEDULER_BACKEND", "selenium")
+        FREEBOX_APP_ID = config.get("FREEBOX_APP_ID", DEFAULT_APP_ID)
+        FREEBOX_APP_TOKEN = config.get("FREEBOX_APP_TOKEN")
+        WAIT_TIMEOUTS = config.get("WAIT_TIMEOUTS", {})
+        RESIDENT_BROWSER = bool(config.get("RESIDENT_BROWSER", True))
+        SELENIUM_REMOTE_URL = config.get("SELENIUM_REMOTE_URL", DEFAULT_REMOTE_URL)
+        BROWSER_MAX_RSS_MB = int(config.get("BROWSER_MAX_RSS_MB", DEFAULT_MAX_RSS_MB))
+        HEADLESS_BROWSER = bool(config.get("HEADLESS_BROWSER", True))
+        tracer.path = config.get("TRACE_FILE", TRACE_FILE)
+    except KeyError as e:
+        logger.error("missing config key: %s", e)
+        sys.exit(1)
+
+    if SCHEDULER_BACKEND not in ("selenium", "api"):
+        logger.error("invalid SCHEDULER_BACKEND: %s", SCHEDULER_BACKEND)
+        sys.exit(1)
+
+    sensitive_filter.update_patterns({
+        "admin_password": ADMIN_PASSWORD,
+        "freebox_ip": FREEBOX_SERVER_IP,
+        "freebox_app_token": FREEBOX_APP_TOKEN,
+    })
+
+    if CRYPTED_CREDENTIALS:
+        try:
+            ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
+            FREEBOX_SERVER_IP = os.getenv("FREEBOX_SERVER_IP")
+            FREEBOX_APP_TOKEN = os.getenv("FREEBOX_APP_TOKEN")
+
+            if not FREEBOX_SERVER_IP or not ADMIN_PASSWORD:
+                logger.error("Credentials not found by keyring.")
+                sys.exit(1)
+            if SCHEDULER_BACKEND == "api" and not FREEBOX_APP_TOKEN:
+                logger.warning("FREEBOX_APP_TOKEN not found by keyring.")
+            sensitive_filter.update_patterns({
+                "admin_password": ADMIN_PASSWORD,
+                "freebox_ip": FREEBOX_SERVER_IP,
+                "freebox_app_token": FREEBOX_APP_TOKEN,
+            })
+
+        except Exception as e:
+            logger.exception("An error occurred while retrieving credentials from keyring.")
+            exit(1)
+
+def init_monitoring():
+    if SENTRY_MONITORING_SDK:
+        import sentry_sdk
+
+        sentry_sdk.init(
+            dsn="https://d8f2365db01e2b4afbb4a25f1157ec67@o4508778574381056.ingest.de.sentry.io/4508868363026512",
+            traces_sample_rate=0,
+            send_default_pii=False,
+            include_local_variables=False,
+            before_send=scrub_event,
+        )
+        if sentry_sdk.Hub.current.client and sentry_sdk.Hub.current.client.options.get("traces_sample_rate", 0) > 0:
+            sentry_sdk.profiler.start_profiler()
+
+# Step timings of the Selenium runs, see run_trace.py
+tracer = SpanTracer()
+
+# New browser sessions opened in a run when the browser connection is lost
+BROWSER_RECONNECTS = 1
 
-sensitive_filter.update_patterns({
-    "admin_password": ADMIN_PASSWORD,
-    "freebox_ip": FREEBOX_SERVER_IP,
-})
-
-month_names_fr = {
-    '01': 'Jan',
-    '02': 'Fév',
-    '03': 'Mar',
-    '04': 'Avr',
-    '05': 'Mai',
-    '06': 'Juin',
-    '07': 'Juil',
-    '08': 'Août',
-    '09': 'Sept',
-    '10': 'Oct',
-    '11': 'Nov',
-    '12': 'Déc'
-}
-
-def translate_month(month_num):
-    if month_num in month_names_fr:
-        return month_names_fr[month_num]
-    else:
-        return "Mois invalide"
 
-def cancel_record(driver):
+class BrowserLostError(WebDriverException):
+    """The browser session no longer answers (crashed Firefox or driver)."""
+
+
+PROGRAMMER_XPATH = "//span[text()='Programmer un enregistrement']"
+INVALID_PASSWORD_XPATH = "//div[contains(text(), 'Identifiants invalides')]"
+
+def cancel_record(driver, waits):
     text_to_click = "Annuler"
     xpath = f"//span[text()='{text_to_click}']"
-    cancel = driver.find_element(By.XPATH, xpath)
-    cancel.click()
-    sleep(5)
+    buttons = driver.find_elements(By.XPATH, xpath)
+    if not buttons or not buttons[0].is_displayed():
+        return
+    buttons[0].click()
+    try:
+        waits.form_closed("cancel")
+    except TimeoutException:
+        logger.error("Timeout: La fenêtre de programmation ne s'est pas fermée.")
 
-def find_element_with_retries(driver, by, value, retries=3, delay=1):
-    """Try to find an element with retries."""
+def find_element_with_retries(driver, waits, by, value, retries=3):
+    """Wait for a clickable element with retries."""
     for attempt in range(retries):
         try:
-            return driver.find_element(by, value)
-        except NoSuchElementException:
+            return waits.clickable("open_form", (by, value))
+        except TimeoutException:
             logger.error(
                 f"Attempt {attempt + 1}/{retries}: Le bouton programmer un enregistrement n'a pas été trouvé."
             )
-            sleep(delay)
     logger.error(
         "Impossible de trouver le bouton programmer un enregistrement après plusieurs tentatives."
     )
@@ -191,384 +259,606 @@ def build_url(use_https, server_ip, path=""):
     full_url = protocol + server_ip + path
     return full_url
 
-if SENTRY_MONITORING_SDK:
-    sentry_sdk.init(
-        dsn="https://d8f2365db01e2b4afbb4a25f1157ec67@o4508778574381056.ingest.de.sentry.io/4508868363026512",
-        traces_sample_rate=0,
-        send_default_pii=False,
-        include_local_variables=False,
-        before_send=scrub_event,
-    )
-    if sentry_sdk.Hub.current.client and sentry_sdk.Hub.current.client.options.get("traces_sample_rate", 0) > 0:
-        sentry_sdk.profiler.start_profiler()
+def check_channels():
+    """Report the channels of channels_free.py sharing a channel number."""
+    for number, names in find_number_collisions().items():
+        logger.warning(
+            "Les chaines %s ont le même numéro %s dans le fichier channels_free.py",
+            ", ".join(names), number
+        )
 
-if CRYPTED_CREDENTIALS:
-    try:
-        ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
-        FREEBOX_SERVER_IP = os.getenv("FREEBOX_SERVER_IP")
+def mark(store, video, status, reason):
+    """Record the outcome of a programme in the store and in the metrics."""
+    store.mark(video, status)
+    metrics.RECORDINGS.inc(status=status, reason=reason)
+    metrics.beat()
 
-        if not FREEBOX_SERVER_IP or not ADMIN_PASSWORD:
-            logger.error("Credentials not found by keyring.")
-            sys.exit(1)
-        sensitive_filter.update_patterns({
-            "admin_password": ADMIN_PASSWORD,
-            "freebox_ip": FREEBOX_SERVER_IP,
-        })
+def read_programmed_recordings():
+    """
+    ProgrammedRecordings of the box read through the Freebox OS API, or
+    None without an app token or when the API cannot be reached.
+    """
+    if not FREEBOX_APP_TOKEN:
+        return None
 
-    except Exception as e:
-        logger.exception("An error occurred while retrieving credentials from keyring.")
-        exit(1)
+    client = FreeboxAPIClient(
+        build_url(HTTPS, FREEBOX_SERVER_IP), FREEBOX_APP_TOKEN, FREEBOX_APP_ID
+    )
+    try:
+        client.login()
+        programmed = ProgrammedRecordings.from_api(client)
+    except (FreeboxAPIError, requests.RequestException) as e:
+        logger.warning(
+            "Lecture des enregistrements programmés sur la Freebox impossible: %s", e
+        )
+        return None
+    finally:
+        client.logout()
 
-if HTTPS is False:
-    url = "http://" + FREEBOX_SERVER_IP
-    title = get_website_title(url)
+    logger.info("%s enregistrement(s) déjà programmé(s) sur la Freebox.", len(programmed))
+    return programmed
 
-    if title != "Freebox OS":
-        logger.error(
-            "Imposible to connect to the Freebox server. Exit programme."
+def plan_recordings(data, starting, store, programmed=None):
+    """
+    Select the programmes to record, respecting MAX_SIM_RECORDINGS.
+    starting holds the (start, end) of the recordings already scheduled.
+    programmed is the optional ProgrammedRecordings of the box: it then
+    replaces starting, and the programmes already programmed are skipped.
+    Returns a list of (video, channel_number, start, end).
+    """
+    if programmed is not None:
+        starting = programmed.intervals()
+    capacity = RecordingCapacity(MAX_SIM_RECORDINGS, starting)
+    recordings = []
+    start_last = None
+
+    for video in data:
+        start = datetime.strptime(video["start"], "%Y%m%d%H%M").replace(
+            tzinfo=ZoneInfo("Europe/Paris")
         )
-        sys.exit(1)
+        if start_last is not None and start == start_last:
+            start += timedelta(minutes=1)
 
-try:
-    with open(
-        "/home/seluser/.local/share/select_freeboxos"
-        "/info_progs.json", "r", encoding='utf-8'
-    ) as jsonfile:
-        data_info_progs = json.load(jsonfile)
-except FileNotFoundError:
-    logger.error(
-        "No info_progs.json file. Need to check curl command or "
-        "internet connection. Exit programme."
-    )
-    sys.exit(1)
-except json.JSONDecodeError:
-    logger.error(
-        "Invalid JSON data in info_progs.json file. The file may be empty or corrupted."
-    )
-    sys.exit(1)
+        start_last = start
+        end = start + timedelta(seconds=video["duration"])
 
-try:
-    with open(
-        "/home/seluser/.local/share/select_freeboxos"
-        "/progs_to_record.json", "r", encoding='utf-8'
-    ) as jsonfile:
-        data = json.load(jsonfile)
-except FileNotFoundError:
-    logger.error(
-        "No progs_to_record.json file. Exit programme."
-    )
-    sys.exit(1)
+        channel_number = find_channel_number(video["channel"])
+        if channel_number is None:
+            logger.error(
+                "La chaine %s n'est pas présente dans le "
+                "fichier channels_free.py", video["channel"]
+            )
+            mark(store, video, SKIPPED, "unknown_channel")
+            continue
+
+        if programmed is not None and programmed.contains(channel_number, start, end):
+            mark(store, video, SCHEDULED, "already_programmed")
+            logger.info(
+                "Le programme %s est déjà programmé sur la Freebox.",
+                validate_video_title(video["title"])
+            )
+            continue
+
+        if capacity.try_add(start, end):
+            recordings.append((video, channel_number, start, end))
+        else:
+            mark(store, video, SKIPPED, "max_simultaneous")
+            logger.info(
+                "Le programme %s ne sera pas enregistré: %s enregistrements "
+                "simultanés sont déjà programmés.",
+                validate_video_title(video["title"]), MAX_SIM_RECORDINGS
+            )
 
-if len(data) == 0 or len(data_info_progs) == 0:
-    src_file = os.path.join(os.path.expanduser("~"), ".local", "share", "select_freeboxos", "info_progs.json")
-    dst_file = os.path.join(os.path.expanduser("~"), ".local", "share", "select_freeboxos", "info_progs_last.json")
-    shutil.copy(src_file, dst_file)
-    logger.info("No data to record programmes. Exit programme.")
-    sys.exit(1)
+    return recordings
 
+def schedule_with_api(recordings, store):
+    """
+    Program the recordings through the Freebox OS API.
+    Returns the recordings which could not be handled because the API is
+    unavailable, so that they can be programmed with Selenium.
+    """
+    client = FreeboxAPIClient(
+        build_url(HTTPS, FREEBOX_SERVER_IP), FREEBOX_APP_TOKEN, FREEBOX_APP_ID
+    )
 
-options = webdriver.FirefoxOptions()
-options.add_argument("start-maximized")
+    try:
+        client.login()
+    except (FreeboxAPIError, requests.RequestException) as e:
+        logger.error("Connexion à l'API Freebox OS impossible: %s", e)
+        return recordings
 
-try:
-    with webdriver.Firefox(options=options) as driver:
-        try:
-            enforce_security_policy(FREEBOX_SERVER_IP, HTTPS)
-            url = build_url(HTTPS, FREEBOX_SERVER_IP, "/login.php#Fbx.os.app.pvr.app")
-            driver.get(url)
-            sleep(8)
-        except WebDriverException as e:
-            if 'net::ERR_ADDRESS_UNREACHABLE' in e.msg:
+    try:
+        for index, (video, channel_number, start, end) in enumerate(recordings):
+            name = None
+            if MEDIA_SELECT_TITLES:
+                name = validate_video_title(video["title"])
+            try:
+                client.program_recording(channel_number, start, end, name)
+                mark(store, video, SCHEDULED, "api")
+            except FreeboxAPIError as e:
+                if e.error_code in API_UNAVAILABLE_ERRORS:
+                    logger.error("L'API Freebox OS n'est plus disponible: %s", e)
+                    return recordings[index:]
+                mark(store, video, FAILED, "api_error")
                 logger.error(
-                    f"The programme cannot reach the address {FREEBOX_SERVER_IP} . Exit programme."
+                    "Impossible de programmer le programme %s avec l'API "
+                    "Freebox OS: %s", validate_video_title(video["title"]), e
                 )
-                driver.quit()
-                sys.exit(1)
-            else:
-                logger.error("A WebDriverException occurred. Exiting the program.")
-                logger.error(f"Exception type: {type(e).__name__}")
-                driver.quit()
-                sys.exit(1)
+            except requests.RequestException as e:
+                logger.error("L'API Freebox OS n'est plus joignable: %s", e)
+                return recordings[index:]
+    finally:
+        client.logout()
 
-        try:
-            login = driver.find_element("id", "fbx-password")
-        except Exception as e:
+    return []
+
+def order_for_form(recordings):
+    """
+    Submit the planned recordings grouped by day and channel, to limit the
+    channel and date changes in the form. The capacity checks were already
+    done in plan_recordings, in the programmes order.
+    """
+    ordered = order_recordings(recordings)
+    saved = sum(transitions(recordings)) - sum(transitions(ordered))
+    if saved > 0:
+        logger.info(
+            "Ordre de programmation optimisé: %s changement(s) de chaine ou de "
+            "jour évité(s) dans le formulaire.", saved
+        )
+    return ordered
+
+def open_pvr_app(driver, waits, reused):
+    """
+    Display the PVR application of Freebox OS. The admin password is only
+    typed when the browser is not (or no longer) logged in.
+    """
+    global ADMIN_PASSWORD
+
+    if reused and not driver.find_elements(*FORM_FIELD):
+        buttons = driver.find_elements(By.XPATH, PROGRAMMER_XPATH)
+        if buttons and buttons[0].is_displayed():
+            return
+
+    try:
+        url = build_url(HTTPS, FREEBOX_SERVER_IP, "/login.php#Fbx.os.app.pvr.app")
+        driver.get(url)
+    except WebDriverException as e:
+        if 'net::ERR_ADDRESS_UNREACHABLE' in e.msg:
             logger.error(
-                "Cannot connect to Freebox OS. Exit programme.", exc_info=False
+                f"The programme cannot reach the address {FREEBOX_SERVER_IP} . Exit programme."
             )
             driver.quit()
             sys.exit(1)
-        sleep(1)
-        login.click()
-        sleep(1)
-        login.send_keys(ADMIN_PASSWORD)
-        ADMIN_PASSWORD = None
-        sleep(1)
-        login.send_keys(Keys.RETURN)
-        sleep(10)
-
-        try:
-            invalid_password = driver.find_element(
-                By.XPATH, "//div[contains(text(), 'Identifiants invalides')]"
-            )
-            logger.error(
-                "Le mot de passe administrateur de la Freebox est invalide. "
-                "La programmation des enregistrements n'a pas "
-                "pu être réalisée. Merci de vérifier le mot de passe."
-            )
+        else:
+            logger.error("A WebDriverException occurred. Exiting the program.")
+            logger.error(f"Exception type: {type(e).__name__}")
             driver.quit()
             sys.exit(1)
-        except NoSuchElementException:
-            pass
 
+    try:
+        waits.until("page_load", EC.any_of(
+            EC.element_to_be_clickable((By.ID, "fbx-password")),
+            EC.element_to_be_clickable((By.XPATH, PROGRAMMER_XPATH)),
+        ))
+    except TimeoutException:
+        logger.error(
+            "Cannot connect to Freebox OS. Exit programme.", exc_info=False
+        )
+        driver.quit()
+        sys.exit(1)
 
-        try:
-            with open(
-                "/home/seluser/.local/share/select_freeboxos"
-                "/info_progs_last.json", "r", encoding='utf-8'
-            ) as jsonfile:
-                data_last = json.load(jsonfile)
-        except FileNotFoundError:
-            data_last = []
-
-        starting = []
-
-        for video in data_last:
-            start = datetime.strptime(video["start"], "%Y%m%d%H%M").replace(
-                tzinfo=ZoneInfo("Europe/Paris")
-            )
-            end = start + timedelta(seconds=video["duration"])
+    logins = driver.find_elements(By.ID, "fbx-password")
+    if not logins or not logins[0].is_displayed():
+        return
+
+    if not ADMIN_PASSWORD:
+        logger.error("La session Freebox OS a expiré et le mot de passe n'est plus disponible.")
+        driver.quit()
+        sys.exit(1)
+
+    login = logins[0]
+    login.click()
+    login.send_keys(ADMIN_PASSWORD)
+    ADMIN_PASSWORD = None
+    login.send_keys(Keys.RETURN)
 
-            starting.append((start, end))
+    try:
+        waits.until("login", EC.any_of(
+            EC.presence_of_element_located((By.XPATH, INVALID_PASSWORD_XPATH)),
+            EC.element_to_be_clickable((By.XPATH, PROGRAMMER_XPATH)),
+        ))
+    except TimeoutException:
+        pass
+
+    if driver.find_elements(By.XPATH, INVALID_PASSWORD_XPATH):
+        logger.error(
+            "Le mot de passe administrateur de la Freebox est invalide. "
+            "La programmation des enregistrements n'a pas "
+            "pu être réalisée. Merci de vérifier le mot de passe."
+        )
+        driver.quit()
+        sys.exit(1)
 
-        now_date = datetime.now().astimezone(ZoneInfo("Europe/Paris")).date()
+def select_channel(waits, channel_uuid, channel_number, store, retries=10):
+    """
+    Select channel_number in the channel field of the recording form.
+    The full value accepted by Freebox OS (e.g. "2/France 2") is learned at
+    the first successful selection and typed in a single step afterwards.
+    Returns the number of attempts needed, 0 if the channel was not found.
+    """
+    def selected(value):
+        return value.split("/")[0] == channel_number
 
-        n = 0
-        last_channel = "x/x"
-        start_last = None
+    known_value = store.channel_value(channel_number)
 
-        for video in data:
-            n += 1
+    attempts = 1
+    current_value = channel_uuid.get_attribute("value")
+    if selected(current_value):
+        if known_value is None:
+            store.learn_channel_value(channel_number, current_value)
+        return attempts
 
-            start = datetime.strptime(video["start"], "%Y%m%d%H%M").replace(
-                tzinfo=ZoneInfo("Europe/Paris")
+    if known_value is not None:
+        channel_uuid.click()
+        channel_uuid.clear()
+        try:
+            waits.value("channel", channel_uuid, lambda value: value == "")
+        except TimeoutException:
+            pass
+        channel_uuid.send_keys(known_value)
+        channel_uuid.click()
+        channel_uuid.send_keys(Keys.RETURN)
+        try:
+            waits.value("channel", channel_uuid, selected)
+            return attempts
+        except TimeoutException:
+            logger.warning(
+                "La valeur %s de la chaine n° %s n'est plus acceptée par Freebox OS.",
+                known_value, channel_number
             )
-            if start_last is not None and start == start_last:
-                start += timedelta(minutes=1)
+            store.forget_channel_value(channel_number)
+        attempts += 1
 
-            start_last = start
-            start_day = start.strftime("%d")
-            start_date = start.date()
-            start_month = start.strftime("%m")
-            start_year = start.strftime("%y")
-            start_hour = start.strftime("%H")
-            start_minute = start.strftime("%M")
+    for _ in range(retries):
+        channel_uuid.clear()
+        channel_uuid.send_keys(channel_number)
+        channel_uuid.send_keys(Keys.RETURN)
+        try:
+            waits.value("channel", channel_uuid, selected)
+        except TimeoutException:
+            attempts += 1
+            continue
+        store.learn_channel_value(channel_number, channel_uuid.get_attribute("value"))
+        return attempts
+
+    return 0
+
+def open_browser_session(persistent=False):
+    return BrowserSession(
+        build_firefox_options(HEADLESS_BROWSER),
+        SELENIUM_REMOTE_URL if RESIDENT_BROWSER else None,
+        max_rss_mb=BROWSER_MAX_RSS_MB,
+        persistent=persistent,
+    )
 
-            end = start + timedelta(seconds=video["duration"])
-            end_hour = end.strftime("%H")
-            end_minute = end.strftime("%M")
+def schedule_recording(driver, waits, date_labels, store, video, channel_number, start, end):
+    """
+    Fill and save the Freebox OS form of one recording. Returns False when
+    no further recording can be programmed in this run.
+    """
+    start_date = start.date()
+    today = datetime.now().astimezone(ZoneInfo("Europe/Paris")).date()
+    if date_labels.is_current(today) and date_labels.label(start_date) is None:
+        logger.error(
+            "La date du programme %s n'est pas proposée par Freebox OS. Le "
+            "programme ne sera pas enregistré.",
+            validate_video_title(video['title'])
+        )
+        mark(store, video, FAILED, "date_not_offered")
+        return True
 
-            try:
-                channel_number = CHANNELS_FREE[video["channel"]]
-            except KeyError:
-                logger.error(
-                    "La chaine %s n'est pas présente dans le "
-                    "fichier channels_free.py", video["channel"]
-                )
-                continue
+    start_hour = start.strftime("%H")
+    start_minute = start.strftime("%M")
 
-            if len(starting) < MAX_SIM_RECORDINGS:
-                starting.append((start, end))
-                to_record = True
-            else:
-                if starting[-MAX_SIM_RECORDINGS][1] < start:
-                    starting.append((start, end))
-                    to_record = True
-                else:
-                    to_record = False
-
-            if to_record:
-                text_to_click = "Programmer un enregistrement"
-                xpath = f"//span[text()='{text_to_click}']"
-                programmer_enregistrements = find_element_with_retries(driver, By.XPATH, xpath)
-                sleep(1)
+    end_hour = end.strftime("%H")
+    end_minute = end.strftime("%M")
+
+    with tracer.span("open_form"):
+        programmer_enregistrements = find_element_with_retries(
+            driver, waits, By.XPATH, PROGRAMMER_XPATH
+        )
+        try:
+            programmer_enregistrements.click()
+        except ElementClickInterceptedException as e:
+            logger.error("A ElementClickInterceptedException occurred.")
+            logger.error(
+                "Impossible de programmer les enregistrements. "
+                "Une fenêtre d'information empêche probablement "
+                "de pouvoir clicker sur le bouton programmer un "
+                "enregistrement."
+            )
+            driver.quit()
+            sys.exit(1)
+        channel_uuid = waits.clickable("open_form", (By.NAME, "channel_uuid"))
+    with tracer.span("channel", number=channel_number) as span:
+        follow_record = select_channel(waits, channel_uuid, channel_number, store)
+        span["attempts"] = follow_record
+    if not follow_record:
+        logger.error(
+            "Impossible de sélectionner la chaîne. Merci de "
+            "vérifier si la chaine n° %s qui "
+            "correspond à la chaine %s "
+            "de MEDIA-select est bien présente dans la liste des "
+            "chaines Freebox. ", channel_number, video["channel"]
+        )
+    if follow_record:
+        with tracer.span("date") as span:
+            date = driver.find_element("name", "date")
+            date.click()
+            if not date_labels.is_current(today):
                 try:
-                    programmer_enregistrements.click()
-                except ElementClickInterceptedException as e:
-                    logger.error("A ElementClickInterceptedException occurred.")
+                    waits.until("date_picker", lambda d: date_labels.read(d, today))
+                except TimeoutException:
+                    pass
+            xpath = date_labels.xpath(start_date)
+            day_click = None
+            if xpath is not None:
+                try:
+                    day_click = waits.clickable("date_picker", (By.XPATH, xpath))
+                except TimeoutException:
+                    logger.error("A TimeoutException occurred.")
+            if day_click is not None:
+                day_click.click()
+            span["found"] = day_click is not None
+        if day_click is None:
+            logger.error(
+                "Impossible de trouver la date pour le programme %s. Le "
+                "programme ne sera pas enregistré.",
+                validate_video_title(video['title'])
+            )
+            mark(store, video, FAILED, "date_not_found")
+            cancel_record(driver, waits)
+            return True
+        to_cancel = False
+        with tracer.span("start_time") as span:
+            start_value = start_hour + ":" + start_minute
+            loop_counter = 0
+            while True:
+                start_time = waits.clickable("time_input", (By.NAME, "start_time"))
+                start_time.clear()
+                start_time.send_keys(start_value)
+                try:
+                    waits.value("time_input", start_time, lambda value: value == start_value)
+                    break
+                except TimeoutException:
+                    logger.error("Timeout: The input field did not update to the correct time.")
+
+                loop_counter += 1
+                if loop_counter > 4:
+                    logger.error(
+                        "Impossible de saisir l'heure de début pour le "
+                        "programme %s. Le programme ne sera pas enregistré.",
+                        validate_video_title(video['title'])
+                    )
+                    to_cancel = True
+                    break
+            start_time.send_keys(Keys.RETURN)
+            span["attempts"] = loop_counter + 1
+        with tracer.span("end_time") as span:
+            end_value = end_hour + ":" + end_minute
+            loop_counter = 0
+            while True:
+                end_time = waits.clickable("time_input", (By.NAME, "end_time"))
+                end_time.clear()
+                end_time.send_keys(end_value)
+                try:
+                    waits.value("time_input", end_time, lambda value: value == end_value)
+                    break
+                except TimeoutException:
+                    logger.error("Timeout: The input field did not update to the correct time.")
+
+                loop_counter += 1
+                if loop_counter > 4:
                     logger.error(
-                        "Impossible de programmer les enregistrements. "
-                        "Une fenêtre d'information empêche probablement "
-                        "de pouvoir clicker sur le bouton programmer un "
-                        "enregistrement."
+                        "Impossible de saisir l'heure de fin pour le "
+                        "programme %s. Le programme ne sera pas enregistré.",
+                        validate_video_title(video['title'])
                     )
-                    driver.quit()
-                    sys.exit(1)
-                sleep(3)
-                channel_uuid = driver.find_element("name", "channel_uuid")
-                sleep(1)
-                n = 0
-                follow_record = True
-                while channel_uuid.get_attribute("value").split("/")[0] != channel_number:
-                    channel_uuid.clear()
-                    sleep(1)
-                    if last_channel.split("/")[0] != channel_number:
-                        channel_uuid.send_keys(channel_number)
-                    else:
-                        channel_uuid.click()
-                        sleep(1)
-                        channel_uuid.clear()
-                        sleep(3)
-                        channel_uuid.send_keys(last_channel)
-                        sleep(1)
-                        channel_uuid.click()
-                    sleep(1)
-                    channel_uuid.send_keys(Keys.RETURN)
-                    sleep(1)
-                    last_channel = channel_uuid.get_attribute("value")
-                    n += 1
-                    if n > 10:
+                    to_cancel = True
+                    break
+            span["attempts"] = loop_counter + 1
+        if to_cancel:
+            mark(store, video, FAILED, "time_input")
+            cancel_record(driver, waits)
+        else:
+            end_time.send_keys(Keys.RETURN)
+            if MEDIA_SELECT_TITLES:
+                title = validate_video_title(video["title"])
+                with tracer.span("title"):
+                    try:
+                        name_prog = waits.visible("title", (By.NAME, "name"))
+                        name_prog.clear()
+                        name_prog.send_keys(title)
+                        waits.value("title", name_prog, lambda value: value == title)
+                    except ElementNotInteractableException:
                         logger.error(
-                            "Impossible de sélectionner la chaîne. Merci de "
-                            "vérifier si la chaine n° %s qui "
-                            "correspond à la chaine %s "
-                            "de MEDIA-select est bien présente dans la liste des "
-                            "chaines Freebox. ", channel_number, video["channel"]
+                            "Une ElementNotInteractableException est apparue. "
+                            "Le titre de MEDIA select ne sera pas utilisé pour "
+                            "nommer le vidéo."
                         )
-                        follow_record = False
-                        break
-                if follow_record:
-                    date = driver.find_element("name", "date")
-                    date.click()
-                    sleep(1)
-                    day_difference = (start_date - now_date).days
-                    if day_difference == 0:
-                        text_to_click = "Aujourd"
-                    elif day_difference == 1:
-                        text_to_click = "Demain"
-                    elif day_difference == 2:
-                        text_to_click = "jours"
-                    else:
-                        text_to_click = start_day + " " + translate_month(start_month)
-                    xpath = f"//li[contains(text(), '{text_to_click}') and not(contains(text(), 'TV'))]"
-                    try:
-                        day_click = driver.find_element(By.XPATH, xpath)
-                    except NoSuchElementException as e:
-                        logger.error("A NoSuchElementException occurred.")
+                    except TimeoutException:
                         logger.error(
-                            "Impossible de trouver la date pour le programme %s. Le "
-                            "programme ne sera pas enregistré.",
-                            validate_video_title(video['title'])
+                            "Timeout: Le titre de MEDIA select n'a pas pu être "
+                            "saisi pour nommer la vidéo."
                         )
-                        cancel_record(driver)
-                        continue
-                    day_click.click()
-                    sleep(1)
-                    to_cancel = False
-                    actual_start = "943463167"
-                    loop_counter = 0
-                    while True:
-                        start_time = driver.find_element("name", "start_time")
-                        start_time.clear()
-                        sleep(0.5)
-                        start_time.send_keys(start_hour + ":" + start_minute)
-                        try:
-                            WebDriverWait(driver, 10).until(
-                                lambda d: start_time.get_attribute("value") == start_hour + ":" + start_minute
-                            )
-                        except:
-                            logger.error("Timeout: The input field did not update to the correct time.")
-
-                        actual_start = start_time.get_attribute("value")
-
-                        if actual_start == start_hour + ":" + start_minute:
-                            break
-                        loop_counter += 1
-                        if loop_counter > 4:
-                            logger.error(
-                                "Impossible de saisir l'heure de début pour le "
-                                "programme %s. Le programme ne sera pas enregistré.",
-                                validate_video_title(video['title'])
-                            )
-                            to_cancel = True
-                            break
-                    sleep(1)
-                    start_time.send_keys(Keys.RETURN)
-                    sleep(1)
-                    actual_end = "943463167"
-                    loop_counter = 0
-                    while True:
-                        end_time = driver.find_element("name", "end_time")
-                        end_time.clear()
-                        sleep(0.5)
-                        end_time.send_keys(end_hour + ":" + end_minute)
-                        try:
-                            WebDriverWait(driver, 10).until(
-                                lambda d: end_time.get_attribute("value") == end_hour + ":" + end_minute
-                            )
-                        except:
-                            logger.error("Timeout: The input field did not update to the correct time.")
-
-                        actual_end = end_time.get_attribute("value")
-
-                        if actual_end == end_hour + ":" + end_minute:
-                            break
-                        loop_counter += 1
-                        if loop_counter > 4:
-                            logger.error(
-                                "Impossible de saisir l'heure de fin pour le "
-                                "programme %s. Le programme ne sera pas enregistré.",
-                                validate_video_title(video['title'])
-                            )
-                            to_cancel = True
-                            break
-                    if to_cancel:
-                        cancel_record(driver)
-                    else:
-                        sleep(1)
-                        end_time.send_keys(Keys.RETURN)
-                        sleep(1)
-                        if MEDIA_SELECT_TITLES:
-                            name_prog = driver.find_element("name", "name")
-                            try:
-                                name_prog.clear()
-                                sleep(1)
-                                name_prog.send_keys(validate_video_title(video["title"]))
-                                sleep(1)
-                            except ElementNotInteractableException:
-                                logger.error(
-                                    "Une ElementNotInteractableException est apparue. "
-                                    "Le titre de MEDIA select ne sera pas utilisé pour "
-                                    "nommer le vidéo."
-                                )
-                        text_to_click = "Sauvegarder"
-                        xpath = f"//span[text()='{text_to_click}']"
-                        sauvegarder = driver.find_element(By.XPATH, xpath)
-                        sauvegarder.click()
-                        sleep(5)
-                        try:
-                            internal_error = driver.find_element(
-                                By.XPATH, "//div[contains(text(), 'Erreur interne')]"
-                            )
-                            logger.error(
-                                "Une erreur interne de la Freebox est survenue. "
-                                "La programmation des enregistrements n'a pas "
-                                "pu être réalisée. Merci de vérifier si le disque "
-                                "dur n'est pas plein."
-                            )
-                            break
-                        except NoSuchElementException:
-                            pass
-                else:
-                    cancel_record(driver)
-
-        sleep(6)
-        driver.quit()
+            internal_error_xpath = "//div[contains(text(), 'Erreur interne')]"
+            with tracer.span("save") as span:
+                text_to_click = "Sauvegarder"
+                xpath = f"//span[text()='{text_to_click}']"
+                sauvegarder = waits.clickable("save", (By.XPATH, xpath))
+                sauvegarder.click()
+                saved = True
+                try:
+                    waits.until("save", EC.any_of(
+                        EC.invisibility_of_element_located(FORM_FIELD),
+                        EC.presence_of_element_located((By.XPATH, internal_error_xpath)),
+                    ))
+                except TimeoutException:
+                    saved = False
+                    logger.error(
+                        "Timeout: La fenêtre de programmation ne s'est pas "
+                        "fermée après la sauvegarde du programme %s.",
+                        validate_video_title(video['title'])
+                    )
+                span["saved"] = saved
+            if driver.find_elements(By.XPATH, internal_error_xpath):
+                mark(store, video, FAILED, "internal_error")
+                logger.error(
+                    "Une erreur interne de la Freebox est survenue. "
+                    "La programmation des enregistrements n'a pas "
+                    "pu être réalisée. Merci de vérifier si le disque "
+                    "dur n'est pas plein."
+                )
+                return False
+            if saved:
+                mark(store, video, SCHEDULED, "form")
+            else:
+                mark(store, video, FAILED, "save_timeout")
+    else:
+        mark(store, video, FAILED, "channel_not_found")
+        cancel_record(driver, waits)
+    return True
+
+
+def browser_alive(driver):
+    """True if the browser session still answers."""
+    try:
+        driver.current_url
+        return True
+    except (WebDriverException, urllib3.exceptions.HTTPError, ConnectionError):
+        return False
+
+
+def schedule_with_selenium(recordings, store, session=None):
+    """Program the recordings by filling the Freebox OS web forms."""
+    if session is None:
+        session = open_browser_session()
+    driver = session.start()
+
+    try:
+        waits = StepWaits(driver, WAIT_TIMEOUTS)
+
+        with tracer.span("login", reused=session.reused):
+            open_pvr_app(driver, waits, session.reused)
+
+        date_labels = DatePickerLabels()
+
+        for video, channel_number, start, end in recordings:
+            try:
+                if not schedule_recording(
+                    driver, waits, date_labels, store, video, channel_number, start, end
+                ):
+                    break
+            except (TimeoutException, NoSuchElementException) as e:
+                # A slow or unexpected page fails this recording only
+                logger.error(
+                    "%s pendant la programmation du programme %s. Le programme ne "
+                    "sera pas enregistré.", type(e).__name__, validate_video_title(video["title"])
+                )
+                mark(store, video, FAILED, "timeout")
+                cancel_record(driver, waits)
+    except (WebDriverException, urllib3.exceptions.HTTPError, ConnectionError) as e:
+        # A crashed Firefox is reported with various plain WebDriverException
+        # messages: ask the session before releasing it
+        if isinstance(e, (TimeoutException, NoSuchElementException)) or browser_alive(driver):
+            raise
+        raise BrowserLostError(type(e).__name__) from e
+    finally:
+        session.release()
+
+
+def schedule_resuming(recordings, store, session=None):
+    """
+    schedule_with_selenium(), resumed in a new browser session from the
+    first recording without a journaled outcome when the connection to the
+    browser is lost.
+    """
+    for attempt in range(BROWSER_RECONNECTS + 1):
+        done = store.marked_in_run()
+        remaining = [rec for rec in recordings if fingerprint(rec[0]) not in done]
+        if not remaining:
+            return
+        try:
+            schedule_with_selenium(remaining, store, session)
+            return
+        except BrowserLostError as e:
+            if attempt == BROWSER_RECONNECTS:
+                raise
+            logger.warning(
+                "Connexion au navigateur perdue (%s). Reprise de la programmation "
+                "au premier enregistrement non confirmé.", e.msg
+            )
+
+
+def run(store, session=None):
+    """
+    One scheduling run: program the pending recordings of the store.
+    session is an optional BrowserSession kept by the caller between runs.
+    """
+    if HTTPS is False:
+        url = "http://" + FREEBOX_SERVER_IP
+        title = get_website_title(url)
+
+        if title != "Freebox OS":
+            logger.error(
+                "Imposible to connect to the Freebox server. Exit programme."
+            )
+            sys.exit(1)
+
+    store.begin_run()
+    data = store.pending()
+
+    if len(data) == 0:
+        store.record_run()
+        logger.info("No data to record programmes. Exit programme.")
+        return
+
+    enforce_security_policy(FREEBOX_SERVER_IP, HTTPS)
+
+    try:
+        recordings = plan_recordings(
+            data, store.scheduled_intervals(), store, read_programmed_recordings()
+        )
+
+        if SCHEDULER_BACKEND == "api":
+            recordings = schedule_with_api(recordings, store)
+            if recordings:
+                logger.warning(
+                    "%s enregistrement(s) seront programmés avec Selenium.",
+                    len(recordings)
+                )
+
+        if recordings:
+            tracer.begin_run()
+            try:
+                schedule_resuming(order_for_form(recordings), store, session)
+            finally:
+                tracer.end_run()
+
+        store.record_run()
+    except Exception as e:
+        logger.error("An unexpected error occurred:")
+        logger.error("Exception type: %s", type(e).__name__)
+        logger.error("Exception message: %s", str(e)[:100])
+
+def main():
+    configure(load_config())
+    init_monitoring()
+    check_channels()
+
+    with RecordingStore() as store:
+        run(store)
+
 
-        src_file = os.path.join(os.path.expanduser("~"), ".local", "share", "select_freeboxos", "info_progs.json")
-        dst_file = os.path.join(os.path.expanduser("~"), ".local", "share", "select_freeboxos", "info_progs_last.json")
-        shutil.copy(src_file, dst_file)
-except Exception as e:
-    logger.error("An unexpected error occurred:")
-    logger.error("Exception type: %s", type(e).__name__)
-    logger.error("Exception message: %s", str(e)[:100])
+if __name__ == "__main__":
+    main()
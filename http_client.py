@@ -0,0 +1,63 @@
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+# Idempotent requests are retried on connection errors and on these statuses
+RETRIES = 3
+BACKOFF_FACTOR = 1
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+POOL_SIZE = 4
+
+_session = None
+
+
+def build_session(retries=RETRIES, backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE):
+    """
+    requests.Session with keep-alive connection pools and bounded retries.
+    Credentials of ~/.netrc are used when a request has no auth, and gzip
+    responses are decoded transparently.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+
+    session = requests.Session()
+    session.trust_env = True
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """Session shared by the whole process, created on first use."""
+    global _session
+    if _session is None:
+        _session = build_session()
+    return _session
+
+
+def close_session():
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def get(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """GET through the shared session, with a default timeout."""
+    return get_session().get(url, timeout=timeout, **kwargs)
@@ -15,6 +15,7 @@ from selenium.common.exceptions import WebDriverException, SessionNotCreatedExce
 from time import sleep
 from subprocess import Popen, PIPE, run
 
+from firefox_profile import build_firefox_options
 from module_freeboxos import get_website_title
 
 logging.basicConfig(
@@ -231,8 +232,7 @@ if crypted.lower() == "non":
         "va maintenant tenter de se connecter à Freebox OS avec votre "
         " mot de passe:")
 
-    options = webdriver.FirefoxOptions()
-    options.add_argument("start-maximized")
+    options = build_firefox_options()
 
     try:
         driver = webdriver.Firefox(options=options)
@@ -243,9 +243,6 @@ if crypted.lower() == "non":
         )
         sys.exit(1)
 
-    #maximize the window size
-    driver.maximize_window()
-
     try:
         if https:
             driver.get(f"https://{FREEBOX_SERVER_IP}/login.php")
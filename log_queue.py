@@ -0,0 +1,116 @@
+import atexit
+import logging
+import queue
+
+from logging.handlers import QueueHandler, QueueListener
+
+# Records waiting for the listener thread
+QUEUE_SIZE = 10000
+
+# When the queue is full, WARNING and above wait this long for a free slot
+# (backpressure), lower levels are dropped at once
+BLOCK_TIMEOUT = 2
+
+_listener = None
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Enqueue records as they are, without formatting them on the caller
+    thread: scrubbing and formatting are left to the listener thread.
+    """
+
+    def __init__(self, log_queue, block_timeout=BLOCK_TIMEOUT):
+        super().__init__(log_queue)
+        self.block_timeout = block_timeout
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                try:
+                    self.queue.put(record, timeout=self.block_timeout)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+
+class ScrubbingQueueListener(QueueListener):
+    """Scrub each record once on the listener thread, before the handlers."""
+
+    def __init__(self, log_queue, sanitizer, *handlers):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.sanitizer = sanitizer
+
+    def enqueue_sentinel(self):
+        # Wait for the records still queued instead of failing on a full queue
+        self.queue.put(self._sentinel)
+
+    def prepare(self, record):
+        if self.sanitizer is not None:
+            self.sanitizer.filter(record)
+        return record
+
+
+def start_queue_logging(logger, handlers, sanitizer=None, queue_size=QUEUE_SIZE):
+    """
+    Route the records of logger through a bounded queue to handlers, written
+    by a background thread. The queue is flushed at interpreter exit.
+    """
+    global _listener
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = BoundedQueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+
+    _listener = ScrubbingQueueListener(log_queue, sanitizer, *handlers)
+    _listener.queue_handler = queue_handler
+    _listener.start()
+    atexit.register(stop_queue_logging)
+    return _listener
+
+
+def add_queue_handler(handler):
+    """Also write the queued records to handler."""
+    if _listener is not None:
+        _listener.handlers = _listener.handlers + (handler,)
+
+
+def remove_queue_handler(handler):
+    """Stop writing the queued records to handler."""
+    if _listener is not None:
+        _listener.handlers = tuple(h for h in _listener.handlers if h is not handler)
+
+
+def queue_depth():
+    """Number of records waiting for the listener thread."""
+    if _listener is None:
+        return 0
+    return _listener.queue.qsize()
+
+
+def stop_queue_logging():
+    """Write the records still in the queue and stop the listener thread."""
+    global _listener
+
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+
+    dropped = listener.queue_handler.dropped
+    if dropped:
+        record = logging.makeLogRecord({
+            "levelno": logging.WARNING,
+            "levelname": "WARNING",
+            "msg": "%s log records dropped, the logging queue was full.",
+            "args": (dropped,),
+        })
+        for handler in listener.handlers:
+            handler.handle(record)
@@ -0,0 +1,259 @@
+"""
+Counters and gauges of the scheduler, and its heartbeat.
+
+The scheduler writes the metrics after each cycle in the Prometheus text
+format to METRICS_TEXTFILE, to be collected by the node-exporter textfile
+collector (or read directly). The heartbeat file, written by the scheduler
+process only, is touched at each cycle, each scheduled recording and every
+minute while box worker processes run; the Docker HEALTHCHECK runs
+
+    python3 metrics.py [--max-age SECONDS]
+
+which fails when the heartbeat is older than HEARTBEAT_MAX_AGE and then
+stops the wedged scheduler, started again by cron_docker.sh.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+METRICS_TEXTFILE = "/var/log/select_freeboxos/select_freeboxos.prom"
+HEARTBEAT_FILE = "/home/seluser/.local/share/select_freeboxos/heartbeat"
+
+# A cycle starts every 5 minutes and programs a recording in under a minute
+HEARTBEAT_MAX_AGE = 1800
+
+# Seconds given to the scheduler to stop after SIGTERM before SIGKILL
+STOP_TIMEOUT = 20
+
+# Only a process running this script is ever stopped by the healthcheck
+SCHEDULER_SCRIPT = "scheduler_daemon.py"
+
+
+class Metric:
+    """A counter or gauge, with one value per set of label values."""
+
+    def __init__(self, name, kind, help_text, labels=()):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[self._key(labels)] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items()):
+            label_text = ",".join(
+                f'{label}="{escape(text)}"' for label, text in zip(self.labels, key)
+            )
+            series = f"{self.name}{{{label_text}}}" if label_text else self.name
+            lines.append(f"{series} {format_value(value)}")
+        return lines
+
+
+def format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_lock = threading.Lock()
+
+# Set by start_heartbeat() in the scheduler process
+_heartbeat_file = None
+
+RUNS = Metric(
+    "select_freeboxos_runs_total", "counter",
+    "Scheduling cycles, by result.", ("result",),
+)
+RECORDINGS = Metric(
+    "select_freeboxos_recordings_total", "counter",
+    "Programmes handled, by status and reason.", ("status", "reason"),
+)
+RUN_DURATION = Metric(
+    "select_freeboxos_run_duration_seconds", "gauge",
+    "Duration of the last scheduling cycle.",
+)
+FETCHES = Metric(
+    "select_freeboxos_fetches_total", "counter",
+    "Downloads of the MEDIA-select programmes, by result.", ("result",),
+)
+FETCH_DURATION = Metric(
+    "select_freeboxos_fetch_duration_seconds", "gauge",
+    "Duration of the last download of the MEDIA-select programmes.",
+)
+FETCH_BYTES = Metric(
+    "select_freeboxos_fetch_bytes", "gauge",
+    "Size of the programmes received at the last download (0 if not modified).",
+)
+LAST_FETCH_SUCCESS = Metric(
+    "select_freeboxos_last_fetch_success_timestamp_seconds", "gauge",
+    "Time of the last successful download of the MEDIA-select programmes.",
+)
+BROWSER_RSS = Metric(
+    "select_freeboxos_browser_rss_bytes", "gauge",
+    "Resident memory of the Firefox processes.",
+)
+PENDING_RECORDINGS = Metric(
+    "select_freeboxos_pending_recordings", "gauge",
+    "Programmes waiting to be scheduled.",
+)
+LOG_QUEUE_DEPTH = Metric(
+    "select_freeboxos_log_queue_depth", "gauge",
+    "Records waiting in the logging queue.",
+)
+HEARTBEAT = Metric(
+    "select_freeboxos_heartbeat_timestamp_seconds", "gauge",
+    "Time of the last heartbeat of the scheduler.",
+)
+
+REGISTRY = (
+    RUNS, RECORDINGS, RUN_DURATION, FETCHES, FETCH_DURATION, FETCH_BYTES,
+    LAST_FETCH_SUCCESS, BROWSER_RSS, PENDING_RECORDINGS, LOG_QUEUE_DEPTH, HEARTBEAT,
+)
+
+
+def render():
+    """All the metrics in the Prometheus text exposition format."""
+    with _lock:
+        lines = [line for metric in REGISTRY for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=METRICS_TEXTFILE):
+    """Write the metrics to path, atomically for the textfile collector."""
+    tmp_file = path + ".tmp"
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(render())
+        os.replace(tmp_file, path)
+    except OSError:
+        pass
+
+
+def snapshot():
+    """Counter values, to be added to the parent's with merge()."""
+    with _lock:
+        return {
+            metric.name: dict(metric.values)
+            for metric in REGISTRY if metric.kind == "counter"
+        }
+
+
+def merge(values):
+    """Add the counter values of a worker process snapshot()."""
+    by_name = {metric.name: metric for metric in REGISTRY}
+    with _lock:
+        for name, series in values.items():
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            for key, value in series.items():
+                metric.values[key] = metric.values.get(key, 0) + value
+
+
+def start_heartbeat(path=HEARTBEAT_FILE):
+    """Make beat() write the heartbeat of this process to path."""
+    global _heartbeat_file
+    _heartbeat_file = path
+    beat()
+
+
+def beat():
+    """Record that the scheduler is alive: its pid and the current time."""
+    if _heartbeat_file is None:
+        return
+    HEARTBEAT.set(int(time.time()))
+    tmp_file = _heartbeat_file + ".tmp"
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(f"{os.getpid()}\n")
+        os.replace(tmp_file, _heartbeat_file)
+    except OSError:
+        pass
+
+
+def read_heartbeat(path=HEARTBEAT_FILE):
+    """(pid, age in seconds) of the heartbeat, or None without heartbeat."""
+    try:
+        age = time.time() - os.stat(path).st_mtime
+        with open(path, "r", encoding="utf-8") as f:
+            pid = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return None
+    return pid, age
+
+
+def is_scheduler(pid):
+    """
+    True if pid is a running scheduler: the pid of the heartbeat may be the
+    one of a previous container, reused by any other process.
+    """
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            args = f.read().split(b"\0")
+    except OSError:
+        return False
+    return any(os.path.basename(arg.decode(errors="replace")) == SCHEDULER_SCRIPT
+               for arg in args)
+
+
+def stop_process(pid, timeout=STOP_TIMEOUT):
+    """SIGTERM pid, then SIGKILL it if it is still alive after timeout."""
+    try:
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(1)
+            os.kill(pid, 0)
+        os.kill(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Healthcheck of the scheduler")
+    parser.add_argument("--max-age", type=float, default=HEARTBEAT_MAX_AGE)
+    parser.add_argument("--file", default=HEARTBEAT_FILE)
+    parser.add_argument("--no-restart", action="store_true",
+                        help="report only, do not stop a wedged scheduler")
+    args = parser.parse_args(argv)
+
+    heartbeat = read_heartbeat(args.file)
+    if heartbeat is None:
+        print("no heartbeat")
+        return 1
+
+    pid, age = heartbeat
+    if age <= args.max_age:
+        print(f"ok: heartbeat {age:.0f}s ago")
+        return 0
+
+    print(f"stale: heartbeat {age:.0f}s ago (max {args.max_age:.0f}s)")
+    if pid and not args.no_restart:
+        if is_scheduler(pid):
+            stop_process(pid)
+        else:
+            print(f"pid {pid} is not the scheduler, not stopped")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import requests
 import logging
-from bs4 import BeautifulSoup
+
+import http_client
 
 
 logger = logging.getLogger(__name__)
@@ -8,8 +9,10 @@ logger = logging.getLogger(__name__)
 
 def get_website_title(url):
     """Get the title of a website."""
+    from bs4 import BeautifulSoup
+
     try:
-        response = requests.get(url, timeout=10)
+        response = http_client.get(url, timeout=10)
         response.raise_for_status()
         soup = BeautifulSoup(response.text, "html.parser")
         title = soup.find("title").string.strip()
@@ -0,0 +1,209 @@
+"""
+Scheduling of several Freeboxes from one container.
+
+config.json may list box profiles in BOXES. Each profile is a dict of
+config.json keys (at least NAME and FREEBOX_SERVER_IP) overriding the
+top-level ones for that box:
+
+    "BOXES": [
+        {"NAME": "salon", "FREEBOX_SERVER_IP": "192.168.1.254",
+         "ADMIN_PASSWORD": "...", "MAX_SIM_RECORDINGS": 2},
+        {"NAME": "chalet", "FREEBOX_SERVER_IP": "chalet.example.org",
+         "HTTPS": true, "ADMIN_PASSWORD": "..."}
+    ],
+    "BOX_WORKERS": 2
+
+Boxes are scheduled concurrently by at most BOX_WORKERS worker processes,
+each one with its own browser (or Freebox API client) quit at the end of
+the box run, so that memory use depends on BOX_WORKERS and not on the
+number of boxes. Every box has its own recordings store and log file.
+"""
+import logging
+import os
+import re
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from logging.handlers import RotatingFileHandler
+from multiprocessing import get_context
+
+import metrics
+
+logger = logging.getLogger("module_freeboxos")
+
+BOX_STORE_PATH = "/home/seluser/.local/share/select_freeboxos/recordings_{name}.db"
+BOX_LOG_FILE = "/var/log/select_freeboxos/select_freeboxos_{name}.log"
+DEFAULT_BOX_WORKERS = 2
+
+# Seconds between two heartbeats of the scheduler while boxes are running
+HEARTBEAT_INTERVAL = 60
+
+BOX_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+# Credentials read from the environment with CRYPTED_CREDENTIALS, suffixed
+# by the upper case box name (e.g. ADMIN_PASSWORD_SALON)
+BOX_ENV_CREDENTIALS = ("ADMIN_PASSWORD", "FREEBOX_SERVER_IP", "FREEBOX_APP_TOKEN")
+
+
+class BoxConfigError(Exception):
+    """Invalid BOXES list in config.json."""
+
+
+def box_profiles(config):
+    """
+    List of (name, config) of the boxes of config.json, each config being
+    the top-level settings updated with the box profile. Empty for a single
+    box configuration.
+    """
+    profiles = config.get("BOXES") or []
+    shared = {key: value for key, value in config.items() if key not in ("BOXES", "BOX_WORKERS")}
+
+    boxes = []
+    names = set()
+    for profile in profiles:
+        name = str(profile.get("NAME", ""))
+        if not BOX_NAME_RE.match(name):
+            raise BoxConfigError(f"invalid box NAME: {name!r}")
+        if name in names:
+            raise BoxConfigError(f"duplicate box NAME: {name!r}")
+        if shared.get("CRYPTED_CREDENTIALS"):
+            # The address is read from the environment, never from the profile
+            if not os.getenv(box_env_key("FREEBOX_SERVER_IP", name)):
+                raise BoxConfigError(
+                    f"missing {box_env_key('FREEBOX_SERVER_IP', name)} for box {name!r}"
+                )
+        elif "FREEBOX_SERVER_IP" not in profile:
+            raise BoxConfigError(f"missing FREEBOX_SERVER_IP for box {name!r}")
+        names.add(name)
+        boxes.append((name, {**shared, **profile}))
+
+    return boxes
+
+
+def box_env_key(key, name):
+    return f"{key}_{name.upper()}"
+
+
+def box_workers(config, box_count):
+    workers = int(config.get("BOX_WORKERS", DEFAULT_BOX_WORKERS))
+    return max(1, min(workers, box_count))
+
+
+def box_store_path(name):
+    return BOX_STORE_PATH.format(name=name)
+
+
+def refresh_boxes(config, boxes):
+    """
+    Download the programmes once for all the boxes whose daily run is due
+    and update their stores. Returns the (name, config) boxes to schedule.
+    """
+    import cron_docker
+
+    from recordings_store import RecordingStore
+
+    due = []
+    for name, box_config in boxes:
+        with RecordingStore(box_store_path(name)) as store:
+            if cron_docker.programmes_due(store):
+                due.append((name, box_config))
+
+    if not due or cron_docker.info_progs_fresh():
+        return []
+
+    cron_docker.download_programmes(config)
+
+    to_schedule = []
+    for name, box_config in due:
+        with RecordingStore(box_store_path(name)) as store:
+            if cron_docker.update_store(store):
+                to_schedule.append((name, box_config))
+    return to_schedule
+
+
+def run_box(name, config):
+    """
+    Scheduling run of one box, in a worker process of its own. Returns the
+    counters of metrics.py of the run.
+    """
+    import freeboxos
+
+    from log_queue import add_queue_handler, remove_queue_handler, stop_queue_logging
+    from recordings_store import RecordingStore
+
+    box_log = RotatingFileHandler(
+        BOX_LOG_FILE.format(name=name),
+        maxBytes=freeboxos.max_bytes,
+        backupCount=freeboxos.backup_count,
+    )
+    box_log.setFormatter(freeboxos.formatter)
+    add_queue_handler(box_log)
+    # Only the scheduler process writes (and rotates) select_freeboxos.log;
+    # the warnings still reach cron_freeboxos.log through stderr, prefixed
+    # by the box name
+    remove_queue_handler(freeboxos.log_handler)
+    freeboxos.log_handler.close()
+    freeboxos.sentry_handler.setFormatter(logging.Formatter(
+        f"%(asctime)s %(levelname)s [{name}] %(message)s", freeboxos.log_datefmt
+    ))
+
+    if config.get("CRYPTED_CREDENTIALS"):
+        # Never fall back to the credentials of the default box
+        for key in BOX_ENV_CREDENTIALS:
+            value = os.getenv(box_env_key(key, name))
+            if value:
+                os.environ[key] = value
+            else:
+                os.environ.pop(key, None)
+
+    # One browser per worker, quit at the end of the run
+    config = {**config, "RESIDENT_BROWSER": False}
+
+    try:
+        freeboxos.configure(config)
+        freeboxos.init_monitoring()
+        with RecordingStore(box_store_path(name)) as store:
+            freeboxos.run(store)
+        return metrics.snapshot()
+    finally:
+        # Worker processes do not run atexit handlers
+        stop_queue_logging()
+
+
+class BoxPool:
+    """Bounded pool of worker processes running run_box()."""
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def run(self, boxes):
+        """Run the given (name, config) boxes, at most self.workers at once."""
+        # A new process per box: the scheduler keeps its settings in module
+        # globals and the browser of a box is quit with its process
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),
+            max_tasks_per_child=1,
+        ) as executor:
+            futures = {
+                executor.submit(run_box, name, config): name for name, config in boxes
+            }
+            pending = set(futures)
+            while pending:
+                # Box runs can be long: keep the heartbeat of the healthcheck fresh
+                done, pending = wait(
+                    pending, timeout=HEARTBEAT_INTERVAL, return_when=FIRST_COMPLETED
+                )
+                metrics.beat()
+                for future in done:
+                    self.report(futures[future], future)
+
+    def report(self, name, future):
+        try:
+            metrics.merge(future.result())
+            logger.info("Box %s: programmation terminée.", name)
+        except SystemExit as e:
+            logger.error("Box %s: programmation interrompue (code %s).", name, e.code)
+        except Exception as e:
+            logger.error(
+                "Box %s: erreur %s pendant la programmation.", name, type(e).__name__
+            )
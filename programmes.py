@@ -0,0 +1,48 @@
+import hashlib
+
+from collections import namedtuple
+
+# Fields identifying a programme. Other fields (title, metadata) may change
+# between two downloads without making it a new programme.
+FINGERPRINT_FIELDS = ("channel", "start", "duration", "id")
+
+ChangeSet = namedtuple("ChangeSet", ["added", "removed", "unchanged"])
+
+
+def fingerprint(programme):
+    """Stable identifier of a programme of the MEDIA-select feed."""
+    key = "|".join(str(programme.get(field, "")) for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def index_programmes(programmes):
+    """Map fingerprint -> programme, keeping the first of duplicates."""
+    index = {}
+    for programme in programmes:
+        index.setdefault(fingerprint(programme), programme)
+    return index
+
+
+def diff_programmes(current, previous):
+    """
+    Compare two lists of programmes by fingerprint in O(n + m).
+    Returns a ChangeSet of lists: programmes only in current (added), only
+    in previous (removed) and in both (unchanged, as found in current).
+    """
+    current_index = index_programmes(current)
+    previous_index = index_programmes(previous)
+
+    added = []
+    unchanged = []
+    for key, programme in current_index.items():
+        if key in previous_index:
+            unchanged.append(programme)
+        else:
+            added.append(programme)
+
+    removed = [
+        programme for key, programme in previous_index.items()
+        if key not in current_index
+    ]
+
+    return ChangeSet(added, removed, unchanged)
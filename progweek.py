@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import requests
+
+import http_client
+
+API_URL = "https://www.media-select.fr/api/v1/progweek"
+ACCEPT = "application/json; indent=4"
+
+MODIFIED = "modified"
+NOT_MODIFIED = "not_modified"
+
+
+class FetchError(Exception):
+    """The progweek API could not be downloaded."""
+
+
+def validators_path(dest):
+    """Validators are stored next to the downloaded file."""
+    root, _ = os.path.splitext(dest)
+    return root + ".validators.json"
+
+
+def load_validators(dest):
+    try:
+        with open(validators_path(dest), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_validators(dest, validators):
+    with open(validators_path(dest), "w", encoding="utf-8") as f:
+        json.dump(validators, f, indent=4)
+
+
+def conditional_headers(dest):
+    """If-None-Match / If-Modified-Since headers, only if dest still exists."""
+    if not os.path.exists(dest):
+        return {}
+
+    validators = load_validators(dest)
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def store_response(dest, body, etag, last_modified):
+    """
+    Write body to dest unless it is identical to the stored content.
+    Returns MODIFIED or NOT_MODIFIED.
+    """
+    content_hash = hashlib.sha256(body).hexdigest()
+    validators = load_validators(dest)
+    unchanged = (
+        os.path.exists(dest) and validators.get("sha256") == content_hash
+    )
+
+    if not unchanged:
+        tmp_file = dest + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(body)
+        os.replace(tmp_file, dest)
+
+    save_validators(dest, {
+        "etag": etag,
+        "last_modified": last_modified,
+        "sha256": content_hash,
+    })
+
+    return NOT_MODIFIED if unchanged else MODIFIED
+
+
+def fetch(dest, auth=None, url=API_URL, timeout=http_client.DEFAULT_TIMEOUT):
+    """
+    Conditional download of the progweek API to dest. Credentials are given
+    as auth, or read from ~/.netrc when auth is None.
+    """
+    headers = {"Accept": ACCEPT}
+    headers.update(conditional_headers(dest))
+
+    try:
+        response = http_client.get(url, auth=auth, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise FetchError(f"API request failed: {e}") from e
+
+    return store_response(
+        dest,
+        response.content,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+    )
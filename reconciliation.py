@@ -0,0 +1,67 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# States of /pvr/programmed/ entries which no longer use a tuner
+INACTIVE_STATES = ("disabled", "start_error", "failed", "finished")
+
+# plan_recordings() delays by one minute a recording starting with the
+# previous one, so a programmed recording may be one minute apart
+START_SHIFTS = (0, 60, -60)
+
+
+def recording_key(channel_number, start, end):
+    """Fingerprint of a recording on the box: channel number, start, end."""
+    return str(channel_number), int(start), int(end)
+
+
+class ProgrammedRecordings:
+    """
+    Recordings already programmed on the Freebox, read once per run, with
+    the recordings added in Freebox OS or on the TV and without the ones
+    deleted there.
+    """
+
+    def __init__(self, recordings):
+        # recordings: iterable of (channel_number, start, end) timestamps, the
+        # channel number being None for a channel missing from the bouquet
+        self.recordings = [
+            (number, int(start), int(end)) for number, start, end in recordings
+        ]
+        self.keys = {
+            recording_key(*recording)
+            for recording in self.recordings if recording[0] is not None
+        }
+
+    @classmethod
+    def from_api(cls, client):
+        """Read the programmed recordings with a logged in FreeboxAPIClient."""
+        numbers = client.channel_numbers()
+        recordings = []
+        for entry in client.programmed_recordings():
+            if entry.get("state") in INACTIVE_STATES:
+                continue
+            # Still uses a tuner even if its channel cannot be matched
+            number = numbers.get(entry.get("channel_uuid"))
+            recordings.append((number, entry["start"], entry["end"]))
+        return cls(recordings)
+
+    def __len__(self):
+        return len(self.recordings)
+
+    def contains(self, channel_number, start, end):
+        """True if the recording of start and end aware datetimes is programmed."""
+        start, end = int(start.timestamp()), int(end.timestamp())
+        return any(
+            recording_key(channel_number, start + shift, end + shift) in self.keys
+            for shift in START_SHIFTS
+        )
+
+    def intervals(self, now=None):
+        """(start, end) as aware datetimes of the recordings not yet over."""
+        now = datetime.now().timestamp() if now is None else now
+        tz = ZoneInfo("Europe/Paris")
+        return [
+            (datetime.fromtimestamp(start, tz), datetime.fromtimestamp(end, tz))
+            for _, start, end in self.recordings
+            if end > now
+        ]
@@ -0,0 +1,59 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+class RecordingCapacity:
+    """
+    Index of scheduled recordings used to enforce MAX_SIM_RECORDINGS.
+
+    Recordings are half-open intervals [start, end): a recording ending at
+    21:00 does not overlap one starting at 21:00. Start and end times are
+    kept in two sorted lists, so that the number of recordings overlapping
+    an interval is found with two binary searches.
+    """
+
+    def __init__(self, max_simultaneous, intervals=()):
+        self.max_simultaneous = max_simultaneous
+        self._starts = sorted(start for start, _ in intervals)
+        self._ends = sorted(end for _, end in intervals)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, start, end):
+        insort(self._starts, start)
+        insort(self._ends, end)
+
+    def overlapping(self, start, end):
+        """Number of recordings overlapping [start, end), in O(log n)."""
+        # Recordings starting before end, minus those already ended at start
+        return bisect_left(self._starts, end) - bisect_right(self._ends, start)
+
+    def in_progress(self, instant):
+        """Number of recordings in progress at instant."""
+        return bisect_right(self._starts, instant) - bisect_right(self._ends, instant)
+
+    def peak(self, start, end):
+        """Maximum number of simultaneous recordings during [start, end)."""
+        if self.overlapping(start, end) == 0:
+            return 0
+
+        # The count only increases at a start time: checking start and every
+        # start inside the interval gives the peak.
+        peak = self.in_progress(start)
+        first = bisect_right(self._starts, start)
+        last = bisect_left(self._starts, end)
+        for instant in self._starts[first:last]:
+            peak = max(peak, self.in_progress(instant))
+        return peak
+
+    def can_add(self, start, end):
+        if self.overlapping(start, end) < self.max_simultaneous:
+            return True
+        return self.peak(start, end) < self.max_simultaneous
+
+    def try_add(self, start, end):
+        """Add the recording if it fits under the limit. Returns True if added."""
+        if not self.can_add(start, end):
+            return False
+        self.add(start, end)
+        return True
@@ -0,0 +1,46 @@
+from itertools import groupby
+
+
+def transitions(recordings):
+    """
+    Number of channel and day changes between consecutive recordings of a
+    list of (video, channel_number, start, end), each one costing UI
+    operations in the Freebox OS form.
+    """
+    channel_changes = 0
+    day_changes = 0
+    previous = None
+    for _, channel_number, start, _ in recordings:
+        if previous is not None:
+            channel_changes += channel_number != previous[0]
+            day_changes += start.date() != previous[1]
+        previous = (channel_number, start.date())
+    return channel_changes, day_changes
+
+
+def order_recordings(recordings):
+    """
+    Order recordings by day, then by channel within a day, each channel in
+    start order. The channel ending a day comes first on the next day when
+    it has recordings on both. Only the order of the form submissions
+    changes: the set of recordings is the same.
+    """
+    by_day = sorted(recordings, key=lambda rec: (rec[2].date(), rec[2]))
+
+    ordered = []
+    last_channel = None
+    for _, day_recordings in groupby(by_day, key=lambda rec: rec[2].date()):
+        channels = {}
+        for recording in day_recordings:
+            channels.setdefault(recording[1], []).append(recording)
+
+        numbers = sorted(channels, key=lambda number: channels[number][0][2])
+        if last_channel in channels:
+            numbers.remove(last_channel)
+            numbers.insert(0, last_channel)
+
+        for number in numbers:
+            ordered.extend(channels[number])
+        last_channel = numbers[-1]
+
+    return ordered
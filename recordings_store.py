@@ -0,0 +1,240 @@
+import json
+import sqlite3
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from programmes import ChangeSet, diff_programmes, fingerprint
+from run_journal import RunJournal
+
+STORE_PATH = "/home/seluser/.local/share/select_freeboxos/recordings.db"
+
+PLANNED = "planned"
+SCHEDULED = "scheduled"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# A failed recording is attempted again at the next runs up to this count
+MAX_ATTEMPTS = 3
+
+# Channel values of the Freebox OS form are learned again after this delay
+CHANNEL_VALUE_TTL = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS programmes (
+    fingerprint TEXT PRIMARY KEY,
+    channel TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    programme TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'planned',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_programmes_start ON programmes (start);
+CREATE INDEX IF NOT EXISTS idx_programmes_status ON programmes (status, start);
+CREATE TABLE IF NOT EXISTS channel_values (
+    number TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    learned_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def programme_interval(programme):
+    """(start, end) timestamps of a MEDIA-select programme."""
+    start = datetime.strptime(programme["start"], "%Y%m%d%H%M").replace(
+        tzinfo=ZoneInfo("Europe/Paris")
+    )
+    end = start + timedelta(seconds=programme["duration"])
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def now_timestamp():
+    return int(datetime.now().timestamp())
+
+
+class RecordingStore:
+    """
+    SQLite state of the programmes received from MEDIA-select, one row per
+    programme fingerprint with its scheduling status and attempt count.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.journal = RunJournal(path + ".journal")
+
+    def close(self):
+        self.journal.close()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM programmes LIMIT 1").fetchone() is None
+
+    def sync(self, programmes):
+        """
+        Update the store with the current MEDIA-select feed: new programmes
+        are added as planned, programmes not yet scheduled which left the
+        feed are removed. Returns a ChangeSet of programme dicts.
+        """
+        statuses = {}
+        previous = []
+        for row in self.conn.execute("SELECT fingerprint, programme, status FROM programmes"):
+            statuses[row["fingerprint"]] = row["status"]
+            previous.append(json.loads(row["programme"]))
+        changes = diff_programmes(programmes, previous)
+        now = now_timestamp()
+
+        with self.conn:
+            for programme in changes.added:
+                start, end = programme_interval(programme)
+                self.conn.execute(
+                    "INSERT INTO programmes (fingerprint, channel, start, end, programme, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (fingerprint(programme), programme["channel"], start, end,
+                     json.dumps(programme), now),
+                )
+
+            # Scheduled programmes are kept until purged
+            removed = []
+            for programme in changes.removed:
+                key = fingerprint(programme)
+                if statuses[key] not in (PLANNED, FAILED):
+                    continue
+                self.conn.execute("DELETE FROM programmes WHERE fingerprint = ?", (key,))
+                removed.append(programme)
+
+        return ChangeSet(changes.added, removed, changes.unchanged)
+
+    def import_scheduled(self, programmes):
+        """Mark programmes scheduled by a previous version as scheduled."""
+        self.sync(programmes)
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE programmes SET status = ? WHERE fingerprint = ?",
+                [(SCHEDULED, fingerprint(programme)) for programme in programmes],
+            )
+
+    def pending(self, now=None):
+        """Programmes to schedule, by start time."""
+        now = now_timestamp() if now is None else now
+        rows = self.conn.execute(
+            "SELECT programme FROM programmes "
+            "WHERE start > ? AND (status = ? OR (status = ? AND attempts < ?)) "
+            "ORDER BY start, fingerprint",
+            (now, PLANNED, FAILED, MAX_ATTEMPTS),
+        )
+        return [json.loads(row["programme"]) for row in rows]
+
+    def scheduled_intervals(self, now=None):
+        """(start, end) as aware datetimes of scheduled recordings not yet over."""
+        now = now_timestamp() if now is None else now
+        rows = self.conn.execute(
+            "SELECT start, end FROM programmes WHERE status = ? AND end > ?",
+            (SCHEDULED, now),
+        )
+        tz = ZoneInfo("Europe/Paris")
+        return [
+            (datetime.fromtimestamp(row["start"], tz), datetime.fromtimestamp(row["end"], tz))
+            for row in rows
+        ]
+
+    def mark(self, programme, status):
+        """
+        Record the outcome of a scheduling attempt for a programme, in the
+        run journal first.
+        """
+        key = fingerprint(programme)
+        self.journal.append(key, status)
+        attempt = 1 if status in (SCHEDULED, FAILED) else 0
+        with self.conn:
+            self.conn.execute(
+                "UPDATE programmes SET status = ?, attempts = attempts + ?, updated_at = ? "
+                "WHERE fingerprint = ?",
+                (status, attempt, now_timestamp(), key),
+            )
+
+    def begin_run(self):
+        """
+        Apply the outcomes journaled by an interrupted run which did not
+        reach the store, then start a new journal.
+        """
+        entries = self.journal.entries()
+        if entries:
+            with self.conn:
+                for key, status in entries:
+                    attempt = 1 if status in (SCHEDULED, FAILED) else 0
+                    self.conn.execute(
+                        "UPDATE programmes SET status = ?, attempts = attempts + ?, updated_at = ? "
+                        "WHERE fingerprint = ? AND status != ?",
+                        (status, attempt, now_timestamp(), key, status),
+                    )
+        self.journal.reset()
+
+    def marked_in_run(self):
+        """Fingerprints of the programmes with an outcome in the current run."""
+        return self.journal.fingerprints()
+
+    def purge(self, before):
+        """Forget programmes which ended before the given timestamp."""
+        with self.conn:
+            self.conn.execute("DELETE FROM programmes WHERE end < ?", (before,))
+
+    def channel_value(self, number, now=None):
+        """
+        Full value of the channel field accepted by Freebox OS for a channel
+        number (e.g. "2/France 2"), or None if unknown or older than the TTL.
+        """
+        now = now_timestamp() if now is None else now
+        row = self.conn.execute(
+            "SELECT value FROM channel_values WHERE number = ? AND learned_at > ?",
+            (number, now - CHANNEL_VALUE_TTL),
+        ).fetchone()
+        return row["value"] if row else None
+
+    def learn_channel_value(self, number, value):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO channel_values (number, value, learned_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(number) DO UPDATE SET value = excluded.value, "
+                "learned_at = excluded.learned_at",
+                (number, value, now_timestamp()),
+            )
+
+    def forget_channel_value(self, number):
+        with self.conn:
+            self.conn.execute("DELETE FROM channel_values WHERE number = ?", (number,))
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, str(value)),
+            )
+
+    def last_run(self):
+        """Datetime of the last completed scheduling run, or None."""
+        value = self.get_meta("last_run")
+        return datetime.fromtimestamp(int(value)) if value else None
+
+    def record_run(self):
+        self.set_meta("last_run", now_timestamp())
+        self.journal.reset()
@@ -0,0 +1,59 @@
+import json
+import os
+import time
+
+
+class RunJournal:
+    """
+    Append-only journal of the scheduling outcomes of the current run.
+
+    Each outcome is written and fsync'd before the recordings store is
+    updated, so that a crash at any point loses no confirmed recording: the
+    journal is replayed in the store when it is opened again. A torn last
+    line, left by a crash while writing, is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def append(self, fingerprint, status):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        line = json.dumps({"fingerprint": fingerprint, "status": status, "at": int(time.time())})
+        self._file.write(line + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def entries(self):
+        """(fingerprint, status) of the journaled outcomes, in order."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                entries.append((entry["fingerprint"], entry["status"]))
+            except (ValueError, KeyError, TypeError):
+                continue
+        return entries
+
+    def fingerprints(self):
+        return {fingerprint for fingerprint, _ in self.entries()}
+
+    def reset(self):
+        """Start a new run: forget the outcomes already applied to the store."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,161 @@
+"""
+Per-step timing of the scheduling runs.
+
+Spans (login, open_form, channel, date, start_time, end_time, title and
+save) are appended as JSON lines to a local file, one object per span:
+
+    {"run": "...", "name": "channel", "start": 1760000000.1,
+     "duration": 0.42, "status": "ok", "attrs": {"attempts": 1}}
+
+Summary of the durations per step across runs:
+
+    python3 run_trace.py [--file TRACE_FILE] [--runs N]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import uuid
+
+from contextlib import contextmanager
+
+TRACE_FILE = "/var/log/select_freeboxos/trace.jsonl"
+
+# The trace file is renamed to TRACE_FILE.1 beyond this size
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+
+STEPS = (
+    "login", "open_form", "channel", "date", "start_time", "end_time", "title", "save",
+)
+
+
+class SpanTracer:
+    """Write timed spans of the current run to a JSON lines file."""
+
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.run_id = None
+        self._file = None
+
+    def begin_run(self):
+        self.end_run()
+        self.run_id = uuid.uuid4().hex[:12]
+
+    def end_run(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Time the enclosed block. The yielded dict of attributes can be
+        updated inside the block; the span is written even on error.
+        """
+        if not self.path:
+            yield attrs
+            return
+
+        start = time.time()
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield attrs
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self._write({
+                "run": self.run_id,
+                "name": name,
+                "start": round(start, 3),
+                "duration": round(time.perf_counter() - started, 4),
+                "status": status,
+                "attrs": attrs,
+            })
+
+    def _write(self, span):
+        try:
+            if self._file is None:
+                self._rotate()
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(span) + "\n")
+            self._file.flush()
+        except OSError:
+            # Tracing must never stop a run
+            self.end_run()
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except FileNotFoundError:
+            pass
+
+
+def read_spans(path):
+    """Spans of a trace file, skipping unreadable lines."""
+    spans = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return spans
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non empty sorted list."""
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[rank - 1]
+
+
+def summarize(spans, runs=None):
+    """
+    Map step -> (count, p50, p95) of the durations in seconds, limited to
+    the last runs if given.
+    """
+    if runs:
+        run_ids = set(list(dict.fromkeys(span.get("run") for span in spans))[-runs:])
+        spans = [span for span in spans if span.get("run") in run_ids]
+
+    durations = {}
+    for span in spans:
+        durations.setdefault(span.get("name"), []).append(span.get("duration", 0))
+
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = (len(values), percentile(values, 0.5), percentile(values, 0.95))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Durée des étapes de programmation")
+    parser.add_argument("--file", default=TRACE_FILE)
+    parser.add_argument("--runs", type=int, default=None, help="dernières exécutions seulement")
+    args = parser.parse_args(argv)
+
+    spans = read_spans(args.file + ".1") + read_spans(args.file)
+    summary = summarize(spans, args.runs)
+    if not summary:
+        print(f"Aucune mesure dans {args.file}")
+        return 1
+
+    order = {name: index for index, name in enumerate(STEPS)}
+    print(f"{'étape':<12} {'nombre':>7} {'p50 (s)':>9} {'p95 (s)':>9}")
+    for name in sorted(summary, key=lambda name: (order.get(name, len(STEPS)), str(name))):
+        count, p50, p95 = summary[name]
+        print(f"{name:<12} {count:>7} {p50:>9.3f} {p95:>9.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
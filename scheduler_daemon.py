@@ -0,0 +1,228 @@
+"""
+Resident scheduler of the container.
+
+One Python process refreshes the MEDIA-select programmes and programs the
+recordings every CYCLE_SECONDS, instead of a bash loop starting
+cron_docker.py and freeboxos.py in new interpreters. SIGTERM and SIGINT
+stop it cleanly, closing the browser session and the recordings store.
+"""
+import os
+import signal
+import sys
+import threading
+import time
+
+from datetime import datetime
+from subprocess import run
+
+import cron_docker
+import freeboxos
+import http_client
+import metrics
+import multi_box
+
+from browser_session import firefox_rss_mb
+from log_queue import queue_depth
+from recordings_store import RecordingStore
+
+logger = freeboxos.logger
+
+INSTALL_DIR = "/home/seluser/select-freeboxos"
+CRON_CONFIG_PATH = "/home/seluser/.config/select_freeboxos/cron_docker.conf"
+LAST_RELEASE_FILE = "/home/seluser/.config/select_freeboxos/.last_release"
+TIMESTAMP_FILE = "/home/seluser/.local/share/select_freeboxos/last_update_check"
+AUTO_UPDATE_LOG = "/var/log/select_freeboxos/auto_update.log"
+
+CYCLE_SECONDS = 300
+FIRST_CYCLE_DELAY = 150
+UPDATE_INTERVAL = 24 * 3600
+
+
+class Shutdown(BaseException):
+    """Raised in the main thread by the signal handler during a cycle."""
+
+
+def read_cron_config(path=CRON_CONFIG_PATH):
+    """START_FREEBOXOS and AUTO_UPDATE flags of cron_docker.conf."""
+    flags = {"START_FREEBOXOS": True, "AUTO_UPDATE": False}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                key, sep, value = line.strip().partition("=")
+                if sep and key in flags:
+                    flags[key] = value.strip().strip('"') == "true"
+    except FileNotFoundError:
+        log_auto_update("Warning: Config file not found. Using default values.")
+    return flags
+
+
+def log_auto_update(message):
+    with open(AUTO_UPDATE_LOG, "a", encoding="utf-8") as f:
+        f.write(message + "\n")
+
+
+def read_file(path, default=""):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return default
+
+
+def auto_update():
+    """
+    Daily update check. Returns True when a new release was installed and
+    the daemon must restart to run it.
+    """
+    now = int(datetime.now().timestamp())
+    try:
+        last_check = int(read_file(TIMESTAMP_FILE, "0"))
+    except ValueError:
+        last_check = 0
+    if now - last_check < UPDATE_INTERVAL:
+        return False
+
+    installed = read_file(LAST_RELEASE_FILE)
+    log_auto_update(f"[{datetime.now().ctime()}] Starting daily auto-update check")
+    with open(AUTO_UPDATE_LOG, "a", encoding="utf-8") as log:
+        run(["bash", "auto_update.sh"], cwd=INSTALL_DIR, stdout=log, stderr=log, check=False)
+
+    with open(TIMESTAMP_FILE, "w", encoding="utf-8") as f:
+        f.write(f"{now}\n")
+
+    return read_file(LAST_RELEASE_FILE) != installed
+
+
+class SchedulerDaemon:
+    def __init__(self, cycle_seconds=CYCLE_SECONDS):
+        self.cycle_seconds = cycle_seconds
+        self.stopping = threading.Event()
+        self.in_cycle = False
+        self.config = None
+        self.config_mtime = None
+        self.store = None
+        self.session = None
+        self.boxes = []
+
+    def handle_signal(self, signum, frame):
+        logger.info("Signal %s received, stopping the scheduler.", signum)
+        self.stopping.set()
+        if self.in_cycle:
+            raise Shutdown()
+
+    def load_config(self):
+        """Parse config.json again only when it changed on disk."""
+        try:
+            mtime = os.stat(freeboxos.CONFIG_PATH).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.config_mtime:
+            self.config = freeboxos.load_config()
+            self.config_mtime = mtime
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+        return self.config
+
+    def cycle(self):
+        flags = read_cron_config()
+
+        if flags["AUTO_UPDATE"] and auto_update():
+            logger.info("New release installed, restarting the scheduler.")
+            self.stopping.set()
+            return
+
+        if not flags["START_FREEBOXOS"]:
+            return
+
+        config = self.load_config()
+
+        boxes = self.boxes = multi_box.box_profiles(config)
+        if boxes:
+            to_schedule = multi_box.refresh_boxes(config, boxes)
+            if to_schedule:
+                workers = multi_box.box_workers(config, len(to_schedule))
+                multi_box.BoxPool(workers).run(to_schedule)
+            return
+
+        if not cron_docker.refresh_programmes(config, self.store):
+            return
+
+        # The admin password is cleared from memory after each login
+        freeboxos.configure(config)
+        if self.session is None:
+            self.session = freeboxos.open_browser_session(persistent=True)
+        freeboxos.run(self.store, self.session)
+
+    def pending_recordings(self):
+        if not self.boxes:
+            return len(self.store.pending())
+        count = 0
+        for name, _ in self.boxes:
+            with RecordingStore(multi_box.box_store_path(name)) as store:
+                count += len(store.pending())
+        return count
+
+    def publish_metrics(self):
+        """Update the gauges and write the metrics textfile."""
+        try:
+            metrics.PENDING_RECORDINGS.set(self.pending_recordings())
+        except Exception:
+            logger.warning("Unable to count the pending recordings for the metrics.")
+        metrics.BROWSER_RSS.set(int(firefox_rss_mb() * 1024 * 1024))
+        metrics.LOG_QUEUE_DEPTH.set(queue_depth())
+        metrics.write_textfile()
+
+    def run_forever(self):
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+        config = self.load_config()
+        # With several boxes, the shared settings are those of the first one
+        boxes = multi_box.box_profiles(config)
+        freeboxos.configure(boxes[0][1] if boxes else config)
+        freeboxos.init_monitoring()
+        freeboxos.check_channels()
+        self.store = RecordingStore()
+        metrics.start_heartbeat()
+
+        delay = FIRST_CYCLE_DELAY
+        try:
+            while not self.stopping.wait(delay):
+                self.in_cycle = True
+                started = time.perf_counter()
+                result = "ok"
+                try:
+                    self.cycle()
+                except SystemExit as e:
+                    result = "stopped"
+                    logger.info("Scheduling cycle stopped (exit code %s).", e.code)
+                except Exception:
+                    result = "error"
+                    logger.exception("Unexpected error in the scheduling cycle.")
+                finally:
+                    self.in_cycle = False
+                metrics.RUNS.inc(result=result)
+                metrics.RUN_DURATION.set(round(time.perf_counter() - started, 3))
+                metrics.beat()
+                self.publish_metrics()
+                delay = self.cycle_seconds
+        except Shutdown:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        http_client.close_session()
+        logger.info("Scheduler stopped.")
+
+
+if __name__ == "__main__":
+    SchedulerDaemon().run_forever()
+    sys.exit(0)
@@ -2,6 +2,10 @@ import logging
 import re
 import socket
 
+from functools import lru_cache
+
+_traceback_formatter = logging.Formatter()
+
 class SensitiveDataFilter(logging.Filter):
     """
     A log-scrubbing filter designed for high-security environments.
@@ -18,34 +22,86 @@ class SensitiveDataFilter(logging.Filter):
       - Prevents leakage of secrets in logs AND Sentry
 
     This filter MUST be installed BEFORE any secrets are loaded and BEFORE
-    any logging occurs, to avoid pre-scrubber leak windows.
+    any logging occurs, to avoid pre-scrubber leak windows. Install it on
+    the logger rather than on each handler: a record is then scrubbed once
+    whatever the number of handlers.
     """
 
     GENERIC_SENSITIVE_WORDS = [
         "password", "token", "secret", "credential", "auth", "authorization"
     ]
 
+    # Scrubbed record.msg format strings kept, most are constant messages
+    MSG_CACHE_SIZE = 512
+
+    # "password: my_secret", "token=12345", "auth :  xyz" but not
+    # "The credentials are missing". A value ending with a keyword
+    # ("auth = xtoken = 12345") goes on with the value of that keyword.
+    VALUE_RULE = r"\s*[:=]\s*[^\s,]+(?:(?:{keyword_ends})(?=\s)\s*[:=]\s*[^\s,]+)*"
+    KEYWORD_RULE = r"(?P<keyword>(?i:{words})){value}"
+
+    # A secret may end with a keyword, or inside one ("mypassword=hunter2"
+    # for "mypassword" or "mypass"): the value of the keyword is then
+    # redacted with the secret
+    SECRET_RULE = r"(?:{secrets})(?:[A-Za-z]{{0,{tail}}}?(?:{keyword_ends})(?P<value>{value}))?"
+
     def __init__(self, secrets=None):
         super().__init__()
-        self.secret_patterns = []
+        self._set_scrubber(self._compile([]))
 
         if secrets:
             self.update_patterns(secrets)
 
+    def _compile(self, secret_values):
+        """
+        One alternation of the keyword rule and of the exact secret values,
+        so that a string is scrubbed in a single regex pass. Longer words and
+        secrets come first to win over their prefixes. The leading lookahead
+        on the possible first characters lets the regex engine skip quickly
+        over the positions where no rule can match.
+        """
+        words = sorted(self.GENERIC_SENSITIVE_WORDS, key=len, reverse=True)
+        secrets = sorted(set(secret_values), key=len, reverse=True)
+
+        keyword_ends = "|".join(f"(?<=(?i:{re.escape(word)}))" for word in words)
+        value = self.VALUE_RULE.format(keyword_ends=keyword_ends)
+
+        rules = [self.KEYWORD_RULE.format(words="|".join(map(re.escape, words)), value=value)]
+        if secrets:
+            rules.append(self.SECRET_RULE.format(
+                secrets="|".join(map(re.escape, secrets)),
+                tail=len(words[0]) - 1,
+                keyword_ends=keyword_ends,
+                value=value,
+            ))
+
+        first_chars = {c for word in words for c in (word[0].lower(), word[0].upper())}
+        first_chars.update(secret[0] for secret in secrets)
+        charset = "".join(re.escape(c) for c in sorted(first_chars))
+
+        return re.compile("(?=[" + charset + "])(?:" + "|".join(rules) + ")")
+
+    def _redact(self, match):
+        keyword = match.group("keyword")
+        if keyword:
+            # The keyword is kept, unless it is a secret value itself
+            return self._scrubber.sub(self._redact, keyword) + "=[REDACTED]"
+
+        return "[REDACTED]=[REDACTED]" if match.group("value") else "[REDACTED]"
+
     def update_patterns(self, secrets: dict):
         """
         Add exact secret values to redact.
         Call this AFTER secrets are loaded.
         """
-        self.secret_patterns = []
-
-        for _, value in secrets.items():
-            if not value:
-                continue
+        values = [str(value) for value in secrets.values() if value]
+        self._set_scrubber(self._compile(values))
 
-            # Escape exact secret value for safe regex
-            pattern = re.escape(str(value))
-            self.secret_patterns.append(re.compile(pattern))
+    def _set_scrubber(self, scrubber):
+        # A new cache, so that no message scrubbed with the previous secrets
+        # is reused
+        self._scrubber = scrubber
+        self._scrub_msg = lru_cache(maxsize=self.MSG_CACHE_SIZE)(self._scrub_string)
 
     def _scrub_string(self, text: str) -> str:
         """Apply generic and exact-pattern scrubbing to any string."""
@@ -53,32 +109,14 @@ class SensitiveDataFilter(logging.Filter):
         if not text:
             return text
 
-        lowered = text.lower()
-
-        # 1. Generic keyword scrubbing (Catching 'key: value' patterns)
-        for word in self.GENERIC_SENSITIVE_WORDS:
-            if word in lowered:
-                # Only redact if the word is followed by an assignment operator (= or :)
-                # This matches: "password: my_secret", "token=12345", "auth :  xyz"
-                # It will NOT match: "The credentials are missing"
-                text = re.sub(
-                    r"(?i)(" + re.escape(word) + r")\s*[:=]\s*[^\s,]+",
-                    r"\1=[REDACTED]",
-                    text,
-                )
-
-        # 2. Precise secret scrubbing (after update_patterns())
-        for pattern in self.secret_patterns:
-            text = pattern.sub("[REDACTED]", text)
-
-        return text
+        return self._scrubber.sub(self._redact, text)
 
     def filter(self, record):
         """Main entry point for Python's logging framework."""
 
         # Scrub main message
         if record.msg:
-            record.msg = self._scrub_string(str(record.msg))
+            record.msg = self._scrub_msg(str(record.msg))
 
         # Scrub arguments
         if record.args:
@@ -104,6 +142,11 @@ class SensitiveDataFilter(logging.Filter):
                         new_args.append(a)
                 evalue.args = tuple(new_args)
 
+            # Format the traceback here, when installed on a logger, so that
+            # handler formatters reuse the scrubbed exc_text
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+
         # Scrub formatted traceback text (generated by handler formatters)
         if hasattr(record, "exc_text") and record.exc_text:
             record.exc_text = self._scrub_string(record.exc_text)
@@ -112,95 +155,116 @@ class SensitiveDataFilter(logging.Filter):
 
 global_sanitizer = SensitiveDataFilter()
 
-def scrub_event(event, hint):
+# Usernames in paths
+USER_HOME_RE = re.compile(r"/home/[^/]+")
+
+STACK_FRAME_FIELDS = ("filename", "abs_path", "context_line", "function")
+STACK_FRAME_LISTS = ("pre_context", "post_context")
+
+
+class EventScrubber:
     """
     Privacy-hardened Sentry scrubber.
     Removes credentials, usernames in paths, hostnames, absolute paths,
     cwd, argv, and sensitive context values.
-    """
 
-    # Use the global instance so it "sees" the same secrets as the logger
-    scrub = global_sanitizer._scrub_string
-
-    # Resolve actual hostname once (fast)
-    try:
-        REAL_HOSTNAME = socket.gethostname()
-    except Exception:
-        REAL_HOSTNAME = None
+    Built once per process: the hostname is resolved at creation and the
+    secret values are those of the sanitizer used by the loggers.
+    """
 
-    # Regex to scrub usernames in paths
-    USER_HOME_RE = re.compile(r"/home/[^/]+")
-    def redact_user_home(value: str) -> str:
-        return USER_HOME_RE.sub("/home/REDACTED_USER", value)
+    def __init__(self, sanitizer):
+        self.sanitizer = sanitizer
+        try:
+            self.hostname = socket.gethostname() or None
+        except Exception:
+            self.hostname = None
 
-    # Safely redact hostname (only when exact match or substring match)
-    def redact_hostname(value: str) -> str:
-        if REAL_HOSTNAME and REAL_HOSTNAME in value:
-            return value.replace(REAL_HOSTNAME, "[REDACTED_HOST]")
-        return value
-
-    def sanitize_value(value):
+    def sanitize_value(self, value):
         if isinstance(value, str):
-            value = scrub(value)
-            value = redact_user_home(value)
-            value = redact_hostname(value)
+            value = self.sanitizer._scrub_string(value)
+            if "/home/" in value:
+                value = USER_HOME_RE.sub("/home/REDACTED_USER", value)
+            if self.hostname and self.hostname in value:
+                value = value.replace(self.hostname, "[REDACTED_HOST]")
         return value
 
-    def sanitize_dict(d):
-        for key, val in list(d.items()):
-            if isinstance(val, str):
-                d[key] = sanitize_value(val)
-            elif isinstance(val, dict):
-                sanitize_dict(val)
-            elif isinstance(val, list):
-                d[key] = [sanitize_value(item) for item in val]
-        return d
-
-    # -------- Scrub event structure --------
-
-    if "server_name" in event:
-        event["server_name"] = "[REDACTED_HOST]"
-
-    if "request" in event:
-        sanitize_dict(event["request"])
-
-    if "extra" in event:
-        sanitize_dict(event["extra"])
-
-    if "exception" in event:
-        for exc in event["exception"].get("values", []):
-            if "value" in exc:
-                exc["value"] = sanitize_value(exc["value"])
-
-            if "stacktrace" in exc:
-                frames = exc["stacktrace"].get("frames", [])
-                for frame in frames:
-                    for k in ("filename", "abs_path", "context_line", "function"):
-                        if k in frame:
-                            frame[k] = sanitize_value(frame[k])
-
-                    if "vars" in frame:
-                        sanitize_dict(frame["vars"])
-
-    if "contexts" in event:
-        sanitize_dict(event["contexts"])
-
-    if "breadcrumbs" in event:
-        filtered = []
-        for crumb in event["breadcrumbs"].get("values", []):
-            if crumb.get("type") == "subprocess":
+    def sanitize(self, container):
+        """
+        Sanitize the strings of nested dicts and lists in place, walking them
+        with an explicit stack instead of recursion.
+        """
+        stack = [container]
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
                 continue
-            sanitize_dict(crumb)
-            filtered.append(crumb)
+            seen.add(id(node))
+
+            items = node.items() if isinstance(node, dict) else enumerate(node)
+            for key, val in list(items):
+                if isinstance(val, str):
+                    node[key] = self.sanitize_value(val)
+                elif isinstance(val, (dict, list)):
+                    stack.append(val)
+        return container
+
+    def sanitize_frame(self, frame):
+        for k in STACK_FRAME_FIELDS:
+            if k in frame:
+                frame[k] = self.sanitize_value(frame[k])
+
+        for k in STACK_FRAME_LISTS:
+            if isinstance(frame.get(k), list):
+                self.sanitize(frame[k])
+
+        if "vars" in frame:
+            self.sanitize(frame["vars"])
+
+    def __call__(self, event, hint):
+        # -------- Scrub event structure --------
+
+        if "server_name" in event:
+            event["server_name"] = "[REDACTED_HOST]"
+
+        # logentry holds the log message of events sent by the logging
+        # integration, captured before the log filter has run
+        for key in ("request", "extra", "contexts", "logentry"):
+            if key in event:
+                self.sanitize(event[key])
+
+        if "message" in event:
+            event["message"] = self.sanitize_value(event["message"])
+
+        if "exception" in event:
+            for exc in event["exception"].get("values", []):
+                if "value" in exc:
+                    exc["value"] = self.sanitize_value(exc["value"])
+
+                if "stacktrace" in exc:
+                    for frame in exc["stacktrace"].get("frames", []):
+                        self.sanitize_frame(frame)
+
+        if "breadcrumbs" in event:
+            filtered = []
+            for crumb in event["breadcrumbs"].get("values", []):
+                if crumb.get("type") == "subprocess":
+                    continue
+                self.sanitize(crumb)
+                filtered.append(crumb)
+
+            event["breadcrumbs"]["values"] = filtered
+
+        # Redact sys.argv and cwd explicitly
+        if "extra" in event:
+            if "sys.argv" in event["extra"]:
+                event["extra"]["sys.argv"] = ["[REDACTED_ARG]"]
 
-        event["breadcrumbs"]["values"] = filtered
+            if "cwd" in event["extra"]:
+                event["extra"]["cwd"] = "[REDACTED_CWD]"
 
-    # Redact sys.argv and cwd explicitly
-    if "extra" in event:
-        if "sys.argv" in event["extra"]:
-            event["extra"]["sys.argv"] = ["[REDACTED_ARG]"]
+        return event
 
-        if "cwd" in event["extra"]:
-            event["extra"]["cwd"] = "[REDACTED_CWD]"
 
-    return event
+# Use the global sanitizer so it "sees" the same secrets as the logger
+scrub_event = EventScrubber(global_sanitizer)
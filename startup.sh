@@ -28,5 +28,20 @@ fi
 echo "[startup] Checking for system security updates..."
 unattended-upgrade
 
-# start the cron_docker.sh script as the seluser user
-su -c "/home/seluser/select-freeboxos/cron_docker.sh" seluser
+# 5. Remove the heartbeat of the previous container: until the scheduler
+# writes its own, the healthcheck must not stop the pid it holds
+rm -f /home/seluser/.local/share/select_freeboxos/heartbeat
+
+# 6. Start the cron_docker.sh script as the seluser user. setpriv runs it
+# directly (su would stay in between and SIGKILL it 2 seconds after a
+# SIGTERM) and the SIGTERM of docker stop is forwarded to it
+setpriv --reuid=seluser --regid=seluser --init-groups \
+    env HOME=/home/seluser USER=seluser LOGNAME=seluser \
+    /home/seluser/select-freeboxos/cron_docker.sh &
+child=$!
+trap 'kill -TERM "$child" 2>/dev/null' TERM INT
+
+# wait returns as soon as the trap has run: wait again for the loop to end
+while kill -0 "$child" 2>/dev/null; do
+    wait "$child" || true
+done
@@ -10,6 +10,8 @@ from selenium.common.exceptions import WebDriverException, SessionNotCreatedExce
 
 from time import sleep
 
+from firefox_profile import build_firefox_options
+
 logging.basicConfig(
     filename="/var/log/select_freeboxos/select_freeboxos.log",
     format="%(asctime)s %(levelname)s: %(message)s",
@@ -29,8 +31,7 @@ else:
 
 freebox_os_password = os.getenv("freebox_os_password")
 
-options = webdriver.FirefoxOptions()
-options.add_argument("start-maximized")
+options = build_firefox_options()
 
 try:
     driver = webdriver.Firefox(options=options)
@@ -39,9 +40,6 @@ except SessionNotCreatedException as e:
     print("A SessionNotCreatedException occured. Exit programme.")
     sys.exit(1)
 
-#maximize the window size
-driver.maximize_window()
-
 try:
     if https:
         driver.get("https://" + FREEBOX_SERVER_IP + "/login.php")
@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recording_capacity import RecordingCapacity
+
+ORIGIN = datetime(2026, 1, 1, 20, 0)
+
+
+def at(minutes):
+    return ORIGIN + timedelta(minutes=minutes)
+
+
+def brute_force_can_add(intervals, start, end, limit):
+    """Reference check: recordings running at start or at any start inside."""
+    instants = [start] + [s for s, _ in intervals if start < s < end]
+    return all(
+        sum(1 for s, e in intervals if s <= instant < e) < limit
+        for instant in instants
+    )
+
+
+def test_back_to_back_recordings_do_not_overlap():
+    capacity = RecordingCapacity(1)
+    assert capacity.try_add(at(0), at(60))
+    assert capacity.try_add(at(60), at(120))
+    assert capacity.overlapping(at(60), at(120)) == 1
+    assert not capacity.try_add(at(59), at(61))
+
+
+def test_exact_limit():
+    capacity = RecordingCapacity(3)
+    for _ in range(3):
+        assert capacity.try_add(at(0), at(60))
+    assert not capacity.try_add(at(30), at(90))
+    assert capacity.try_add(at(60), at(90))
+    assert len(capacity) == 4
+
+
+def test_long_recording_over_several_short_ones():
+    capacity = RecordingCapacity(2)
+    # Short recordings one after another: never more than one at a time
+    for index in range(6):
+        assert capacity.try_add(at(20 * index), at(20 * index + 20))
+    assert capacity.overlapping(at(0), at(120)) == 6
+    assert capacity.peak(at(0), at(120)) == 1
+    assert capacity.try_add(at(0), at(120))
+    # Now two recordings run at every instant of [0, 120)
+    assert not capacity.try_add(at(100), at(180))
+    assert capacity.try_add(at(120), at(180))
+
+
+def test_seeded_from_existing_intervals():
+    existing = [(at(0), at(60)), (at(30), at(90))]
+    capacity = RecordingCapacity(2, existing)
+    assert len(capacity) == 2
+    assert capacity.in_progress(at(45)) == 2
+    assert not capacity.can_add(at(40), at(50))
+    assert capacity.can_add(at(90), at(100))
+    assert capacity.can_add(at(60), at(70))
+
+
+def test_agrees_with_brute_force_on_random_intervals():
+    rng = random.Random(5)
+    for limit in (1, 2, 3):
+        capacity = RecordingCapacity(limit)
+        intervals = []
+        for _ in range(300):
+            start = at(5 * rng.randrange(400))
+            end = start + timedelta(minutes=5 * rng.randint(1, 36))
+            expected = brute_force_can_add(intervals, start, end, limit)
+            assert capacity.try_add(start, end) == expected
+            if expected:
+                intervals.append((start, end))